@@ -46,6 +46,7 @@ if "bpy" in locals():
 
     #imp.reload(draw)
 else:
+    import time
     import bpy
     from . import ui
     from . import preferences
@@ -54,6 +55,7 @@ else:
     from . import operators
     from . import export
     from . import nodes
+    from . import shader_scan
     #from . import draw
 
 
@@ -94,13 +96,20 @@ class Render3Delight(bpy.types.RenderEngine):
 
 
 def register():
+    start = time.time()
     preferences.register()
     properties.register()
     operators.register()
     export.register()
     #draw.register()
     bpy.utils.register_module(__name__)
+    
+    nodes_start = time.time()
     nodes.init()
+    
+    end = time.time()
+    print("3Delight: registered in %.2fs, %d shader node types in %.2fs" % \
+            (end - start, len(nodes.RendermanShaderTree.nodetypes), end - nodes_start))
 
 
 def unregister():
@@ -109,6 +118,7 @@ def unregister():
     ui.unregister()
     operators.unregister()
     export.unregister()
+    shader_scan.unregister()
     #draw.unregister()
     bpy.utils.unregister_module(__name__)
 
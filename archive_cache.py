@@ -0,0 +1,154 @@
+# ##### BEGIN MIT LICENSE BLOCK #####
+#
+# Copyright (c) 2011 Matt Ebb
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
+#
+# ##### END MIT LICENSE BLOCK #####
+
+import os
+import hashlib
+from array import array
+
+# On disk cache of geometry RIB archives, named by a hash of their contents.
+# Unchanged geometry is written once, and read back with ReadArchive on later exports.
+# Least recently used archives are removed when the cache grows past its size limit.
+
+archive_caches = {}
+
+def get_archive_cache(cache_dir, max_size):
+    if cache_dir not in archive_caches:
+        archive_caches[cache_dir] = ArchiveCache(cache_dir)
+    cache = archive_caches[cache_dir]
+    cache.max_size = max_size
+    return cache
+
+
+class ArchiveHash:
+    ''' Accumulates a content hash from geometry arrays and settings '''
+
+    def __init__(self):
+        self.hash = hashlib.sha1()
+
+    def add(self, data):
+        if type(data) == array:
+            self.hash.update(data.typecode.encode())
+            self.hash.update(data.tobytes())
+        elif type(data) in (list, tuple):
+            try:
+                self.hash.update(array('d', data).tobytes())
+            except TypeError:
+                self.hash.update(repr(data).encode())
+        else:
+            self.hash.update(str(data).encode())
+        # separator, so consecutive items can't run into each other
+        self.hash.update(b'\0')
+
+    def hexdigest(self):
+        return self.hash.hexdigest()
+
+
+class ArchiveCache:
+
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+        self.max_size = 0
+        self.reset_stats()
+
+        # archives referenced by the current export, never evicted
+        # since the RIB is only rendered after the export finishes
+        self.in_use = set()
+
+    def begin(self):
+        self.in_use.clear()
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.hits = 0
+        self.misses = 0
+        self.evicted = 0
+
+    def path(self, key):
+        return os.path.join(self.cache_dir, key + '.rib')
+
+    # mark an archive as used by the current export, returns False if it's gone
+    def use(self, path):
+        if not os.path.exists(path):
+            return False
+
+        # touch the archive to mark it as recently used
+        try:
+            os.utime(path, None)
+        except OSError:
+            pass
+
+        self.in_use.add(path)
+        return True
+
+    # return the archive path if it's already cached, or None
+    def lookup(self, key):
+        path = self.path(key)
+        if not self.use(path):
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return path
+
+    # prepare a path to write a new archive to
+    def new_path(self, key):
+        if not os.path.exists(self.cache_dir):
+            os.makedirs(self.cache_dir)
+        path = self.path(key)
+        self.in_use.add(path)
+        return path
+
+    # remove least recently used archives until the cache fits in max_size bytes,
+    # or only archives in use are left
+    def evict(self):
+        if self.max_size <= 0 or not os.path.exists(self.cache_dir):
+            return
+
+        entries = []
+        total = 0
+        for f in os.listdir(self.cache_dir):
+            if os.path.splitext(f)[1] != '.rib':
+                continue
+            path = os.path.join(self.cache_dir, f)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            total += st.st_size
+            if path not in self.in_use:
+                entries.append( (st.st_mtime, st.st_size, path) )
+
+        for mtime, size, path in sorted(entries):
+            if total <= self.max_size:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            self.evicted += 1
+
+    def summary(self):
+        return "Archive cache: %d hits, %d misses, %d evicted" % (self.hits, self.misses, self.evicted)
@@ -0,0 +1,604 @@
+# ##### BEGIN MIT LICENSE BLOCK #####
+#
+# Copyright (c) 2011 Matt Ebb
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
+#
+# ##### END MIT LICENSE BLOCK #####
+
+import os
+import sys
+import ast
+import types
+import tempfile
+import importlib
+from array import array
+
+from . import fake_mathutils
+
+# Minimal stand in for blender's bpy module, so the exporter can be imported
+# and run outside of blender. Only what the exporter and the shader parameter
+# code use is provided: properties defined with bpy.props are real descriptors
+# with their default values, and RNA introspection (bl_rna, rna_type) is
+# derived from them. Scenes and their data are plain python objects, built by
+# the benchmark scenarios through the helper classes here.
+
+addon_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+addon_name = 'renderman'
+
+# working directory for exported RIB, archives, and config files
+work_dir = tempfile.mkdtemp(prefix='rm_bench_')
+
+
+# ------------- Properties -------------
+
+rna_types = {'BoolProperty': 'BOOLEAN',
+             'BoolVectorProperty': 'BOOLEAN',
+             'IntProperty': 'INT',
+             'IntVectorProperty': 'INT',
+             'FloatProperty': 'FLOAT',
+             'FloatVectorProperty': 'FLOAT',
+             'StringProperty': 'STRING',
+             'EnumProperty': 'ENUM',
+             'PointerProperty': 'POINTER',
+             'CollectionProperty': 'COLLECTION'}
+
+vector_subtypes = ('TRANSLATION', 'DIRECTION', 'VELOCITY', 'ACCELERATION', 'XYZ', 'EULER')
+
+# plain float arrays, blender's bpy_prop_array
+class bpy_prop_array(list):
+    pass
+
+class Property:
+    ''' A bpy.props property, holding a value for each instance of the class it's set on '''
+
+    def __init__(self, kind, kwargs):
+        self.kind = kind
+        self.kwargs = kwargs
+        self.type = rna_types[kind]
+        self.subtype = kwargs.get('subtype', 'NONE')
+        self.is_hidden = 'HIDDEN' in kwargs.get('options', ())
+        self.name = kwargs.get('name', '')
+
+    def coerce(self, value):
+        if self.kind == 'FloatVectorProperty':
+            if self.subtype == 'COLOR':
+                return fake_mathutils.Color(value)
+            elif self.subtype in vector_subtypes:
+                return fake_mathutils.Vector(value)
+            return bpy_prop_array(float(v) for v in value)
+        elif self.kind in ('IntVectorProperty', 'BoolVectorProperty'):
+            return bpy_prop_array(value)
+        elif self.kind == 'FloatProperty':
+            return float(value)
+        return value
+
+    def default(self):
+        kwargs = self.kwargs
+        if self.kind == 'PointerProperty':
+            return kwargs['type']()
+        elif self.kind == 'CollectionProperty':
+            return Collection(type=kwargs['type'])
+        elif self.kind == 'EnumProperty':
+            if 'default' in kwargs:
+                return kwargs['default']
+            items = kwargs.get('items', ())
+            # items from callbacks need a context, so aren't evaluated
+            if callable(items) or len(items) == 0:
+                return ''
+            return items[0][0]
+        elif self.kind.endswith('VectorProperty'):
+            size = kwargs.get('size', 3)
+            return self.coerce(kwargs.get('default', [0] * size))
+        
+        defaults = {'BOOLEAN': False, 'INT': 0, 'FLOAT': 0.0, 'STRING': ''}
+        return self.coerce(kwargs.get('default', defaults[self.type]))
+
+    def __get__(self, obj, owner):
+        if obj is None:
+            return self
+        values = obj.__dict__.setdefault('_rna_values', {})
+        try:
+            return values[self]
+        except KeyError:
+            value = values[self] = self.default()
+            return value
+
+    def __set__(self, obj, value):
+        obj.__dict__.setdefault('_rna_values', {})[self] = self.coerce(value)
+
+def property_function(kind):
+    def prop(**kwargs):
+        return Property(kind, kwargs)
+    prop.__name__ = kind
+    return prop
+
+
+# ------------- RNA structs -------------
+
+class RNAStruct:
+    ''' RNA description of a struct type, as in bl_rna and rna_type '''
+
+    def __init__(self, cls):
+        self.cls = cls
+        self.name = cls.__name__
+        self.identifier = cls.__name__
+        self.properties = {}
+        for klass in reversed(cls.__mro__):
+            for name, value in vars(klass).items():
+                if isinstance(value, Property):
+                    self.properties[name] = value
+
+    @property
+    def base(self):
+        for klass in self.cls.__mro__[1:]:
+            if isinstance(klass, StructMeta):
+                return rna_struct(klass)
+        return None
+
+# RNA descriptions are cached, and rebuilt when properties are added or removed
+rna_structs = {}
+
+def rna_struct(cls):
+    rna = rna_structs.get(cls)
+    if rna is None:
+        rna = rna_structs[cls] = RNAStruct(cls)
+    return rna
+
+class StructMeta(type):
+
+    def __setattr__(cls, name, value):
+        type.__setattr__(cls, name, value)
+        if isinstance(value, Property):
+            rna_structs.clear()
+
+    def __delattr__(cls, name):
+        type.__delattr__(cls, name)
+        rna_structs.clear()
+
+    @property
+    def bl_rna(cls):
+        return rna_struct(cls)
+
+class Struct(metaclass=StructMeta):
+    ''' Base for all bpy.types, attributes can be given as keywords '''
+
+    def __init__(self, **attrs):
+        for name, value in attrs.items():
+            setattr(self, name, value)
+
+    @property
+    def bl_rna(self):
+        return rna_struct(type(self))
+
+    @property
+    def rna_type(self):
+        return rna_struct(type(self))
+
+
+# ------------- Collections -------------
+
+class Collection(list):
+    ''' bpy_prop_collection, indexed by position or name '''
+
+    def __init__(self, items=(), type=None):
+        list.__init__(self, items)
+        self.type = type
+        self.active = None
+        self.is_updated = False
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            for item in self:
+                if item.name == key:
+                    return item
+            raise KeyError(key)
+        return list.__getitem__(self, key)
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def keys(self):
+        return [item.name for item in self]
+
+    def values(self):
+        return list(self)
+
+    def items(self):
+        return [(item.name, item) for item in self]
+
+    def add(self):
+        item = self.type()
+        self.append(item)
+        return item
+
+    def remove(self, item):
+        # evaluated meshes from to_mesh() were never added
+        if item in self:
+            list.remove(self, item)
+
+class Element:
+    ''' One element of an ArrayCollection, reading its values from the arrays '''
+
+    def __init__(self, collection, index):
+        self.collection = collection
+        self.index = index
+
+    def __getattr__(self, name):
+        collection = self.collection
+        i = self.index
+        if name in collection.element_attrs:
+            return collection.element_attrs[name][i]
+        if name not in collection.arrays:
+            raise AttributeError(name)
+        data = collection.arrays[name]
+        size = len(data) // collection.length
+        if size == 1:
+            return data[i]
+        return data[i*size:(i+1)*size]
+
+class ArrayCollection:
+    ''' Mesh or particle elements, stored as flat arrays for foreach_get '''
+
+    def __init__(self, length, element_attrs={}, **arrays):
+        self.length = length
+        self.arrays = arrays
+        # values per element that can't be read with foreach_get
+        self.element_attrs = element_attrs
+
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, i):
+        return Element(self, i)
+
+    def __iter__(self):
+        return (Element(self, i) for i in range(self.length))
+
+    def foreach_get(self, attr, seq):
+        data = self.arrays[attr]
+        if type(seq) == array and seq.typecode != data.typecode:
+            data = array(seq.typecode, data)
+        seq[:] = data
+
+
+# ------------- ID data -------------
+
+class ID(Struct):
+    name = ''
+    is_updated = False
+    is_updated_data = False
+
+class Scene(ID):
+
+    def __init__(self, **attrs):
+        self.frame_current = 1
+        self.frame_subframe = 0.0
+        self.layers = [True] + [False] * 19
+        self.objects = Collection()
+        self.camera = None
+        self.world = None
+        self.render = types.SimpleNamespace(resolution_x=640, resolution_y=480, resolution_percentage=100,
+                                            pixel_aspect_x=1.0, pixel_aspect_y=1.0)
+        self.frame_sets = 0
+        ID.__init__(self, **attrs)
+
+    def frame_set(self, frame, subframe=0.0):
+        self.frame_current = frame
+        self.frame_subframe = subframe
+        self.frame_sets += 1
+
+class Object(ID):
+
+    def __init__(self, **attrs):
+        self.type = 'EMPTY'
+        self.data = None
+        self.parent = None
+        self.layers = [True] + [False] * 19
+        self.hide_render = False
+        self.matrix_world = fake_mathutils.Matrix()
+        self.matrix_local = fake_mathutils.Matrix()
+        self.location = fake_mathutils.Vector()
+        self.animation_data = None
+        self.constraints = []
+        self.modifiers = Collection()
+        self.material_slots = Collection()
+        self.particle_systems = Collection()
+        self.vertex_groups = Collection()
+        self.dupli_type = 'NONE'
+        self.dupli_list = []
+        self.bound_box = [[0.0] * 3 for i in range(8)]
+        ID.__init__(self, **attrs)
+
+    # the mesh is already evaluated, the renderer would get the same arrays
+    def to_mesh(self, scene, apply_modifiers, settings):
+        return self.data.evaluated()
+
+class Mesh(ID):
+
+    def __init__(self, **attrs):
+        self.vertices = ArrayCollection(0, co=array('f'), normal=array('f'))
+        self.polygons = ArrayCollection(0, loop_total=array('i'), loop_start=array('i'))
+        self.loops = ArrayCollection(0, vertex_index=array('i'))
+        self.edges = ArrayCollection(0, crease=array('f'), vertices=array('i'))
+        self.uv_layers = Collection()
+        self.uv_textures = Collection()
+        self.vertex_colors = Collection()
+        self.materials = []
+        ID.__init__(self, **attrs)
+
+    def evaluated(self):
+        mesh = Mesh(name=self.name, vertices=self.vertices, polygons=self.polygons, 
+                    loops=self.loops, edges=self.edges, uv_layers=self.uv_layers,
+                    uv_textures=self.uv_textures, vertex_colors=self.vertex_colors, 
+                    materials=self.materials)
+        mesh.renderman = self.renderman
+        return mesh
+
+    def transform(self, matrix):
+        pass
+
+class Material(ID):
+
+    def __init__(self, **attrs):
+        self.diffuse_color = fake_mathutils.Color((0.8, 0.8, 0.8))
+        self.alpha = 1.0
+        ID.__init__(self, **attrs)
+
+class Lamp(ID):
+
+    def __init__(self, **attrs):
+        self.type = 'POINT'
+        self.energy = 1.0
+        self.color = fake_mathutils.Color((1.0, 1.0, 1.0))
+        self.spot_size = 0.785
+        ID.__init__(self, **attrs)
+
+class Camera(ID):
+
+    def __init__(self, **attrs):
+        self.type = 'PERSP'
+        self.lens = 35.0
+        self.sensor_width = 32.0
+        self.sensor_height = 18.0
+        self.sensor_fit = 'AUTO'
+        self.clip_start = 0.1
+        self.clip_end = 100.0
+        self.ortho_scale = 7.0
+        self.dof_object = None
+        self.dof_distance = 0.0
+        ID.__init__(self, **attrs)
+
+class World(ID):
+    pass
+
+class Texture(ID):
+    pass
+
+class ParticleSettings(ID):
+
+    def __init__(self, **attrs):
+        self.type = 'EMITTER'
+        ID.__init__(self, **attrs)
+
+class ParticleSystem(Struct):
+
+    def __init__(self, **attrs):
+        self.name = ''
+        self.settings = ParticleSettings()
+        self.particles = ArrayCollection(0)
+        Struct.__init__(self, **attrs)
+
+
+# ------------- Nodes -------------
+
+class NodeSocket(Struct):
+
+    def __init__(self, **attrs):
+        self.name = ''
+        self.bl_idname = ''
+        self.is_linked = False
+        self.ui_open = False
+        self.array = False
+        Struct.__init__(self, **attrs)
+
+class NodeSockets(Collection):
+
+    def new(self, bl_idname, name):
+        socket = NodeSocket(name=name, bl_idname=bl_idname)
+        self.append(socket)
+        return socket
+
+class Node(Struct):
+
+    def __init__(self, **attrs):
+        self.name = ''
+        self.location = [0.0, 0.0]
+        self.inputs = NodeSockets()
+        self.outputs = NodeSockets()
+        # blender gives custom nodes the 'CUSTOM' type, the exporter 
+        # finds output nodes by their class name
+        self.type = type(self).__name__
+        self.bl_idname = type(self).__name__
+        Struct.__init__(self, **attrs)
+
+class NodeLink(Struct):
+    pass
+
+class NodeLinks(Collection):
+
+    def new(self, from_socket, to_socket, from_node=None, to_node=None):
+        link = NodeLink(from_socket=from_socket, to_socket=to_socket, from_node=from_node, to_node=to_node)
+        to_socket.is_linked = True
+        from_socket.is_linked = True
+        self.append(link)
+        return link
+
+class NodeTree(ID):
+
+    def __init__(self, **attrs):
+        self.nodes = Collection()
+        self.links = NodeLinks()
+        ID.__init__(self, **attrs)
+
+
+# ------------- Modules -------------
+
+class TypesModule(types.ModuleType):
+    ''' bpy.types, with a generic struct type for anything not defined here '''
+
+    def __getattr__(self, name):
+        if name.startswith('__'):
+            raise AttributeError(name)
+        cls = StructMeta(name, (Struct,), {})
+        setattr(self, name, cls)
+        return cls
+
+def persistent(func):
+    return func
+
+def user_resource(resource_type, path='', create=False):
+    resource_dir = os.path.join(work_dir, 'config', resource_type.lower(), path)
+    if create and not os.path.exists(resource_dir):
+        os.makedirs(resource_dir)
+    return resource_dir
+
+def abspath(path, start=None, library=None):
+    if path.startswith('//'):
+        return os.path.join(start or work_dir, path[2:])
+    return path
+
+def new_data():
+    return types.SimpleNamespace(filepath='',
+        objects=Collection(), meshes=Collection(), materials=Collection(),
+        lamps=Collection(), cameras=Collection(), worlds=Collection(), 
+        textures=Collection(), node_groups=Collection(), texts=Collection(), 
+        scenes=Collection(), particles=Collection(), images=Collection())
+
+def make_bpy():
+    bpy = types.ModuleType('bpy')
+    bpy.__path__ = []
+    
+    bpy_types = TypesModule('bpy.types')
+    for cls in (Struct, ID, Scene, Object, Mesh, Material, Lamp, Camera, World, Texture,
+                ParticleSettings, ParticleSystem, NodeSocket, Node, NodeLink, NodeTree):
+        setattr(bpy_types, cls.__name__, cls)
+    bpy_types.PropertyGroup = StructMeta('PropertyGroup', (Struct,), {'name': Property('StringProperty', {})})
+    bpy_types.AddonPreferences = StructMeta('AddonPreferences', (Struct,), {})
+    
+    # properties.py lists the property editor's contexts when it's imported
+    context_items = [types.SimpleNamespace(identifier=i, name=i.title()) for i in ('RENDER', 'WORLD', 'OBJECT', 'MATERIAL')]
+    bpy_types.SpaceProperties = types.SimpleNamespace(
+        bl_rna=types.SimpleNamespace(properties={'context': types.SimpleNamespace(enum_items=context_items)}))
+    bpy.types = bpy_types
+    
+    props = types.ModuleType('bpy.props')
+    for kind in rna_types:
+        setattr(props, kind, property_function(kind))
+    bpy.props = props
+    
+    handlers = types.ModuleType('bpy.app.handlers')
+    handlers.persistent = persistent
+    for name in ('load_pre', 'load_post', 'save_pre', 'save_post', 'scene_update_pre', 'scene_update_post',
+                 'render_pre', 'render_post', 'frame_change_pre', 'frame_change_post'):
+        setattr(handlers, name, [])
+    
+    app = types.ModuleType('bpy.app')
+    app.__path__ = []
+    app.version = (2, 69, 0)
+    app.version_string = '2.69 (benchmark)'
+    app.tempdir = work_dir
+    app.background = True
+    app.handlers = handlers
+    bpy.app = app
+    
+    bpy.utils = types.SimpleNamespace(register_class=lambda cls: None, unregister_class=lambda cls: None,
+                                      register_module=lambda name: None, unregister_module=lambda name: None,
+                                      user_resource=user_resource)
+    bpy.path = types.SimpleNamespace(abspath=abspath)
+    bpy.ops = types.SimpleNamespace()
+    bpy.data = new_data()
+    bpy.context = types.SimpleNamespace(scene=None, user_preferences=types.SimpleNamespace(addons=Collection()))
+    
+    return {'bpy': bpy, 'bpy.types': bpy_types, 'bpy.props': props, 'bpy.app': app, 'bpy.app.handlers': handlers}
+
+def install():
+    if 'bpy' in sys.modules:
+        return sys.modules['bpy']
+    
+    modules = make_bpy()
+    modules['mathutils'] = fake_mathutils
+    modules['bpy_types'] = types.ModuleType('bpy_types')
+    
+    bpy_extras = types.ModuleType('bpy_extras')
+    bpy_extras.__path__ = []
+    io_utils = types.ModuleType('bpy_extras.io_utils')
+    io_utils.ExportHelper = type('ExportHelper', (), {})
+    bpy_extras.io_utils = io_utils
+    modules.update({'bpy_extras': bpy_extras, 'bpy_extras.io_utils': io_utils})
+    
+    sys.modules.update(modules)
+    return modules['bpy']
+
+def reset_data():
+    bpy = sys.modules['bpy']
+    bpy.data = new_data()
+
+def read_bl_info():
+    with open(os.path.join(addon_dir, '__init__.py')) as f:
+        tree = ast.parse(f.read())
+    for node in tree.body:
+        if isinstance(node, ast.Assign) and node.targets[0].id == 'bl_info':
+            return ast.literal_eval(node.value)
+
+# import the addon as a package, without running its __init__, which registers the interface.
+# The addon's properties are registered, and the exporter modules imported
+def load_addon():
+    if addon_name in sys.modules:
+        return sys.modules[addon_name]
+    
+    bpy = install()
+    
+    # 3Delight paths and exporter env vars, so init_env leaves the environment alone
+    for var in ('DELIGHT', 'OUT', 'SHD', 'PTC', 'ARC'):
+        os.environ.setdefault(var, os.path.join(work_dir, var.lower()))
+    os.environ.setdefault('DL_SHADERS_PATH', os.path.join(addon_dir, 'shaders'))
+    
+    addon = types.ModuleType(addon_name)
+    addon.__path__ = [addon_dir]
+    addon.__file__ = os.path.join(addon_dir, '__init__.py')
+    addon.bl_info = read_bl_info()
+    sys.modules[addon_name] = addon
+    
+    preferences = importlib.import_module(addon_name + '.preferences')
+    properties = importlib.import_module(addon_name + '.properties')
+    properties.register()
+    for name in ('export', 'nodes', 'shader_parameters'):
+        setattr(addon, name, importlib.import_module(addon_name + '.' + name))
+    addon.preferences = preferences
+    addon.properties = properties
+    
+    prefs = types.SimpleNamespace(name=addon_name, module=addon_name, preferences=preferences.RendermanPreferences())
+    bpy.context.user_preferences.addons.append(prefs)
+    
+    return addon
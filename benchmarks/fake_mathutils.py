@@ -0,0 +1,154 @@
+# ##### BEGIN MIT LICENSE BLOCK #####
+#
+# Copyright (c) 2011 Matt Ebb
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
+#
+# ##### END MIT LICENSE BLOCK #####
+
+import math
+
+# Minimal stand in for blender's mathutils, enough for the exporter to run
+# outside of blender. Matrices multiply with *, as in blender 2.6x.
+
+
+class Vector(list):
+
+    def __init__(self, seq=(0.0, 0.0, 0.0)):
+        list.__init__(self, (float(v) for v in seq))
+
+    def __add__(self, other):
+        return Vector(a + b for a, b in zip(self, other))
+
+    def __sub__(self, other):
+        return Vector(a - b for a, b in zip(self, other))
+
+    def __neg__(self):
+        return Vector(-a for a in self)
+
+    def __mul__(self, other):
+        return Vector(a * other for a in self)
+
+    @property
+    def length(self):
+        return math.sqrt(sum(a * a for a in self))
+
+    def copy(self):
+        return Vector(self)
+
+
+class Color(Vector):
+    pass
+
+
+class Euler(Vector):
+    pass
+
+
+class Quaternion(list):
+
+    def __init__(self, seq=(1.0, 0.0, 0.0, 0.0)):
+        list.__init__(self, (float(v) for v in seq))
+
+    def to_matrix(self):
+        w, x, y, z = self
+        return Matrix(([1.0 - 2*(y*y + z*z), 2*(x*y - w*z), 2*(x*z + w*y)],
+                       [2*(x*y + w*z), 1.0 - 2*(x*x + z*z), 2*(y*z - w*x)],
+                       [2*(x*z - w*y), 2*(y*z + w*x), 1.0 - 2*(x*x + y*y)]))
+
+    def __mul__(self, other):
+        return self.to_matrix() * other
+
+
+class Matrix:
+    ''' Square matrix, stored as a list of rows '''
+
+    def __init__(self, rows=None):
+        if rows is None:
+            rows = [[1.0 if i == j else 0.0 for j in range(4)] for i in range(4)]
+        self.rows = [[float(v) for v in row] for row in rows]
+
+    def __getitem__(self, i):
+        return self.rows[i]
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __mul__(self, other):
+        n = len(self.rows)
+        if isinstance(other, Matrix):
+            return Matrix([[sum(self.rows[i][k] * other.rows[k][j] for k in range(n)) 
+                                for j in range(n)] for i in range(n)])
+        
+        # vectors are extended with w = 1 for 4x4 matrices
+        v = list(other) + [1.0] * (n - len(other))
+        return Vector(sum(self.rows[i][k] * v[k] for k in range(n)) for i in range(len(other)))
+
+    def __imul__(self, other):
+        self.rows = (self * other).rows
+        return self
+
+    def copy(self):
+        return Matrix(self.rows)
+
+    @property
+    def translation(self):
+        return Vector(row[3] for row in self.rows[:3])
+
+    def to_translation(self):
+        return self.translation
+
+    def to_3x3(self):
+        return Matrix(row[:3] for row in self.rows[:3])
+
+    def to_quaternion(self):
+        m = self.to_3x3().rows
+        w = math.sqrt(max(0.0, 1.0 + m[0][0] + m[1][1] + m[2][2])) / 2.0
+        if w < 1e-6:
+            return Quaternion()
+        return Quaternion((w, (m[2][1] - m[1][2]) / (4*w), (m[0][2] - m[2][0]) / (4*w), (m[1][0] - m[0][1]) / (4*w)))
+
+    def to_euler(self):
+        m = self.to_3x3().rows
+        cy = math.hypot(m[0][0], m[1][0])
+        if cy > 1e-6:
+            return Euler((math.atan2(m[2][1], m[2][2]), math.atan2(-m[2][0], cy), math.atan2(m[1][0], m[0][0])))
+        return Euler((math.atan2(-m[1][2], m[1][1]), math.atan2(-m[2][0], cy), 0.0))
+
+    @classmethod
+    def Translation(cls, v):
+        m = cls()
+        for i in range(3):
+            m.rows[i][3] = v[i]
+        return m
+
+    @classmethod
+    def Rotation(cls, angle, size, axis):
+        c, s = math.cos(angle), math.sin(angle)
+        if axis == 'X':
+            r = [[1, 0, 0], [0, c, -s], [0, s, c]]
+        elif axis == 'Y':
+            r = [[c, 0, s], [0, 1, 0], [-s, 0, c]]
+        else:
+            r = [[c, -s, 0], [s, c, 0], [0, 0, 1]]
+        m = cls()
+        for i in range(3):
+            m.rows[i][:3] = r[i]
+        return m
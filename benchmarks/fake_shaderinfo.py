@@ -0,0 +1,118 @@
+# ##### BEGIN MIT LICENSE BLOCK #####
+#
+# Copyright (c) 2011 Matt Ebb
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
+#
+# ##### END MIT LICENSE BLOCK #####
+
+import os
+import sys
+import stat
+
+# Stand in for 3Delight's shaderinfo, for timing the shader scan without 3Delight.
+# It reads stub shaders written by stub_shaders(), with the same output layout 
+# as shaderinfo for the -t, -d and -a flags, and fails on anything else.
+# install() puts an executable running it first on PATH. The time it takes to 
+# start up stands in for shaderinfo's, which is most of the cost of a scan.
+
+stub_magic = '# stub shader'
+
+# (name, type, default) of the parameters each stub shader has
+stub_params = [('Kd', 'float', '0.5'),
+               ('Ks', 'float', '0.5'),
+               ('roughness', 'float', '0.1'),
+               ('specularcolor', 'color', '1 1 1'),
+               ('texturename', 'string', ''),
+               ('coshaders', 'shader[]', '')]
+
+stub_types = ('surface', 'light', 'shader')
+
+def stub_shaders(path, count):
+    if not os.path.exists(path):
+        os.makedirs(path)
+    
+    filenames = []
+    for i in range(count):
+        name = 'stub_%04d' % i
+        filename = os.path.join(path, name + '.sdl')
+        with open(filename, 'w') as f:
+            f.write('%s\n%s %s\n' % (stub_magic, stub_types[i % len(stub_types)], name))
+            for param in stub_params:
+                f.write('%s %s %s\n' % param)
+        filenames.append(filename)
+    return filenames
+
+def install(bin_dir):
+    if not os.path.exists(bin_dir):
+        os.makedirs(bin_dir)
+    
+    path = os.path.join(bin_dir, 'shaderinfo')
+    with open(path, 'w') as f:
+        f.write('#!%s\n' % sys.executable)
+        f.write('import sys\n')
+        f.write('sys.path.insert(0, %r)\n' % os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        f.write('from benchmarks.fake_shaderinfo import main\n')
+        f.write('sys.exit(main(sys.argv[1:]))\n')
+    os.chmod(path, os.stat(path).st_mode | stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH)
+    
+    os.environ['PATH'] = bin_dir + os.pathsep + os.environ.get('PATH', '')
+
+def read_stub(filename):
+    with open(filename) as f:
+        lines = f.read().split('\n')
+    if lines[0] != stub_magic:
+        raise ValueError("Not a stub shader: %s" % filename)
+    
+    shader_type, name = lines[1].split()
+    params = [l.split(' ', 2) for l in lines[2:] if l != '']
+    return name, shader_type, params
+
+def tabular(name, shader_type, params):
+    lines = [name, shader_type, str(len(params))]
+    for pname, ptype, default in params:
+        lines.append('%s,input,uniform,%s,,1,%s' % (pname, ptype.replace('[]', ''), default))
+    return lines
+
+def declaration(name, shader_type, params):
+    lines = ['%s "%s"' % (shader_type, name)]
+    for pname, ptype, default in params:
+        lines.append('    "%s" "parameter uniform %s"' % (pname, ptype))
+    return lines
+
+def annotations(name, shader_type, params):
+    return ['"__name" "%s"' % name]
+
+def main(args):
+    if len(args) < 2 or args[0] not in ('-t', '-d', '-a'):
+        sys.stderr.write("usage: shaderinfo -t|-d|-a shader.sdl ...\n")
+        return 1
+    
+    output = {'-t': tabular, '-d': declaration, '-a': annotations}[args[0]]
+    lines = []
+    for filename in args[1:]:
+        try:
+            lines += output(*read_stub(filename))
+        except (IOError, OSError, ValueError):
+            sys.stderr.write("shaderinfo: cannot read %s\n" % filename)
+            return 1
+    
+    sys.stdout.write('\n'.join(lines) + '\n')
+    return 0
@@ -0,0 +1,323 @@
+# ##### BEGIN MIT LICENSE BLOCK #####
+#
+# Copyright (c) 2011 Matt Ebb
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
+#
+# ##### END MIT LICENSE BLOCK #####
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import importlib
+import platform
+import multiprocessing
+import tracemalloc
+import contextlib
+
+from . import fake_bpy
+from . import fake_shaderinfo
+from . import scenes
+
+# Each scenario builds a synthetic scene, then times exporting it.
+# Scenes are built and shader parameters generated before timing starts, 
+# the time reported is the fastest of the repeated runs. Peak memory is 
+# measured with tracemalloc in a separate run, since tracing slows python down.
+
+def export_module():
+    return sys.modules[fake_bpy.addon_name].export
+
+def reset_export_caches():
+    export = export_module()
+    export.motion_cache.reset()
+    export.motion_cache.reset_stats()
+    export.reset_particle_snapshots()
+    export.reset_mesh_cache()
+    export.reset_mesh_cache_stats()
+    export.reset_rib_compression_stats()
+
+def generate_shader_parameters(scene):
+    export_module().rna_types_initialise(scene)
+
+# the same steps as a render export, without rendering shadow maps and point clouds
+def write_rib(scene):
+    export = export_module()
+    
+    export.init_env(scene)
+    rpass = export.RPass(scene, export.renderable_objects(scene), export.initialise_paths(scene))
+    export.export_updates.begin(scene, rpass.paths['export_dir'], rpass.incremental)
+    reset_export_caches()
+    
+    export.write_rib(rpass, scene, lambda txt: None)
+    
+    export.close_geometry_pool()
+    export.export_updates.end(rpass.incremental)
+
+def export_archive(scene):
+    export = export_module()
+    objects = [ob for ob in export.renderable_objects(scene) if ob.type == 'MESH']
+    export.export_archive(scene, objects, frame_start=1, frame_end=3)
+
+# shader parameter classes are generated from scratch on each run
+def rna_types_initialise(scene):
+    export = export_module()
+    export.shader_rna_registry.classes.clear()
+    export.shader_rna_registry.assigned.clear()
+    export.rna_types_initialise(scene)
+
+# a large mesh's arrays, extracted once, to time formatting them on their own
+def extract_rib_arrays(scene):
+    export = export_module()
+    data = export.get_mesh_data(scene, scene.objects['Grid'], 'POLYGON_MESH')
+    scene.rib_arrays = [('P', data['P']), ('nverts', data['nverts']), ('verts', data['verts'])] + data['primvars']
+
+def write_rib_arrays(scene, write):
+    util = sys.modules[fake_bpy.addon_name].util
+    with open(util.user_path(scene.renderman.path_rib_output, scene=scene), 'w') as file:
+        for decl, data in scene.rib_arrays:
+            write(file, decl, data)
+
+def write_arrays_bulk(scene):
+    util = sys.modules[fake_bpy.addon_name].util
+    write_rib_arrays(scene, lambda file, decl, data: util.write_rib_array(file, '"%s" ' % decl, data, ' \n'))
+
+# formatting with rib(), as the exporter did before write_rib_array
+def write_arrays_rib(scene):
+    util = sys.modules[fake_bpy.addon_name].util
+    write_rib_arrays(scene, lambda file, decl, data: file.write('"%s" %s \n' % (decl, util.rib(data))))
+
+# name: (build scene, prepare scene, timed export)
+scenarios = {
+    'large_mesh': (scenes.large_mesh_scene, generate_shader_parameters, write_rib),
+    'subdivision': (scenes.subdivision_scene, generate_shader_parameters, write_rib),
+    'many_meshes': (scenes.many_meshes_scene, generate_shader_parameters, write_rib),
+    'motion_blur': (scenes.motion_blur_scene, generate_shader_parameters, write_rib),
+    'hair': (scenes.hair_scene, generate_shader_parameters, write_rib),
+    'particles': (scenes.particles_scene, generate_shader_parameters, write_rib),
+    'particle_instances': (scenes.particle_instances_scene, generate_shader_parameters, write_rib),
+    'many_lights': (scenes.many_lights_scene, generate_shader_parameters, write_rib),
+    'node_trees': (scenes.node_trees_scene, generate_shader_parameters, write_rib),
+    'shader_parameters': (scenes.shader_parameters_scene, None, rna_types_initialise),
+    'archive': (scenes.archive_scene, generate_shader_parameters, export_archive),
+    'parallel_export': (scenes.parallel_export_scene, generate_shader_parameters, write_rib),
+    'rib_arrays': (scenes.large_mesh_scene, extract_rib_arrays, write_arrays_bulk),
+    'rib_arrays_rib': (scenes.large_mesh_scene, extract_rib_arrays, write_arrays_rib),
+    }
+
+def output_size(path):
+    size = 0
+    for root, dirs, files in os.walk(path):
+        size += sum(os.path.getsize(os.path.join(root, f)) for f in files)
+    return size
+
+def clear_output(path):
+    if os.path.exists(path):
+        shutil.rmtree(path)
+    os.mkdir(path)
+
+def build_scenario(name, scale, **kwargs):
+    build, prepare, run = scenarios[name]
+    
+    scene = build(scale, **kwargs)
+    scene.renderman.path_rib_output = os.path.join(fake_bpy.work_dir, name, '{scene}.rib')
+    
+    if prepare is not None:
+        prepare(scene)
+    return scene
+
+# times run, with setup called untimed before each run
+def time_runs(run, repeat, measure_memory, setup=None):
+    times = []
+    for i in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        run()
+        times.append(time.perf_counter() - start)
+    
+    result = {'time': min(times), 'times': times, 'peak_memory': None}
+    
+    if measure_memory:
+        if setup is not None:
+            setup()
+        tracemalloc.start()
+        try:
+            run()
+            result['peak_memory'] = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    
+    return result
+
+def time_scenario(name, scene, repeat, measure_memory):
+    build, prepare, run = scenarios[name]
+    out_dir = os.path.join(fake_bpy.work_dir, name)
+    
+    result = time_runs(lambda: run(scene), repeat, measure_memory, lambda: clear_output(out_dir))
+    result['rib_bytes'] = output_size(out_dir)
+    
+    shutil.rmtree(out_dir)
+    return result
+
+def run_scenario(name, scale, repeat, measure_memory):
+    scene = build_scenario(name, scale)
+    return time_scenario(name, scene, repeat, measure_memory)
+
+# the same scene exported with 1 to max_workers geometry export processes,
+# with the speedup of each relative to a single worker
+def run_parallel_scaling(scale, repeat, measure_memory, max_workers):
+    scene = build_scenario('parallel_export', scale)
+    results = {}
+    
+    for workers in range(1, max_workers+1):
+        scene.renderman.export_processes = workers
+        result = time_scenario('parallel_export', scene, repeat, measure_memory)
+        result['workers'] = workers
+        result['speedup'] = results['parallel_export_1']['time'] / result['time'] if workers > 1 else 1.0
+        results['parallel_export_%d' % workers] = result
+    
+    return results
+
+# particle instances at fixed counts, whatever the scale, to check export time
+# grows linearly with the number of particles
+particle_instance_counts = (1000, 10000, 100000)
+
+def run_particle_instance_scaling(scale, repeat, measure_memory, max_workers):
+    results = {}
+    
+    for count in particle_instance_counts:
+        scene = build_scenario('particle_instances', scale, count=count)
+        result = time_scenario('particle_instances', scene, repeat, measure_memory)
+        result['particles'] = count
+        result['time_per_particle'] = result['time'] / count
+        results['particle_instances_%d' % count] = result
+    
+    return results
+
+# number of stub shaders scanned at scale 1.0
+shader_scan_count = 300
+
+# a scan of all the shaders in path, as the background shader scan does
+def scan_shaders(path, settings, workers):
+    shader_info = importlib.import_module(fake_bpy.addon_name + '.shader_info')
+    shader_scan = importlib.import_module(fake_bpy.addon_name + '.shader_scan')
+    
+    # reloaded from the cache file, as after starting blender
+    shader_info.shader_info_cache.shaders = None
+    
+    index = shader_scan.ShaderIndex()
+    index.set_paths([path])
+    index.update(settings, workers)
+    index.close()
+    shader_info.save_shader_info_cache(settings)
+    return len(index.shaders)
+
+# stub shaders scanned through the fake shaderinfo, with 1 to max_workers shaderinfo
+# processes at once. Cold scans run shaderinfo on every shader, warm scans read them
+# all from the cache file saved by the cold scans
+def run_shader_scan_scaling(scale, repeat, measure_memory, max_workers):
+    scan_dir = os.path.join(fake_bpy.work_dir, 'shader_scan')
+    shader_dir = os.path.join(scan_dir, 'shaders')
+    count = len(fake_shaderinfo.stub_shaders(shader_dir, scenes.scaled(shader_scan_count, scale)))
+    fake_shaderinfo.install(os.path.join(scan_dir, 'bin'))
+    
+    settings = {'use_sdl_reader': True, 'cache_path': os.path.join(scan_dir, 'shaderinfo_cache.json')}
+    
+    def clear_cache():
+        if os.path.exists(settings['cache_path']):
+            os.remove(settings['cache_path'])
+    
+    def scan():
+        if scan_shaders(shader_dir, settings, workers) != count:
+            raise RuntimeError("Shader scan didn't find all %d stub shaders" % count)
+    
+    results = {}
+    for workers in range(1, max_workers+1):
+        for cache in ('cold', 'warm'):
+            setup = clear_cache if cache == 'cold' else None
+            result = time_runs(scan, repeat, measure_memory, setup)
+            result['workers'] = workers
+            result['shaders'] = count
+            
+            first = results.get('shader_scan_%s_1' % cache, result)
+            result['speedup'] = first['time'] / result['time']
+            results['shader_scan_%s_%d' % (cache, workers)] = result
+    
+    shutil.rmtree(scan_dir)
+    return results
+
+# runs reporting results for several settings, instead of a single scenario
+scaling_runs = {
+    'parallel_export': run_parallel_scaling,
+    'particle_instances': run_particle_instance_scaling,
+    'shader_scan': run_shader_scan_scaling,
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks', description="Time exporting synthetic scenes, without blender")
+    parser.add_argument('--scenario', action='append', choices=sorted(set(scenarios) | set(scaling_runs)),
+                        help="scenario to run, can be given several times. Runs all by default")
+    parser.add_argument('--scale', type=float, default=1.0, help="scene size, relative to the default. particle_instances always runs at fixed counts")
+    parser.add_argument('--repeat', type=int, default=3, help="number of timed runs of each scenario")
+    parser.add_argument('--no-memory', action='store_true', help="skip measuring peak memory")
+    parser.add_argument('--output', help="file to write the JSON report to, instead of stdout")
+    parser.add_argument('--workers', type=int, default=multiprocessing.cpu_count(),
+                        help="parallel_export and shader_scan run with 1 up to this many processes. Defaults to the number of cores")
+    args = parser.parse_args(argv)
+    
+    addon = fake_bpy.load_addon()
+    
+    report = {'addon_version': '.'.join(str(v) for v in addon.bl_info['version']),
+              'python_version': platform.python_version(),
+              'platform': platform.platform(),
+              'scale': args.scale,
+              'repeat': args.repeat,
+              'scenarios': {}}
+    
+    for name in args.scenario or list(scenarios.keys()) + ['shader_scan']:
+        if (name == 'parallel_export' and not addon.export.parallel_export_supported()) or \
+            (name == 'shader_scan' and os.name != 'posix'):
+            print("%s: not supported on this platform, skipped" % name, file=sys.stderr)
+            continue
+        
+        print("%s..." % name, file=sys.stderr)
+        
+        # the exporter prints as it goes
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            if name in scaling_runs:
+                results = scaling_runs[name](args.scale, args.repeat, not args.no_memory, args.workers)
+            else:
+                results = {name: run_scenario(name, args.scale, args.repeat, not args.no_memory)}
+        
+        for result_name, result in results.items():
+            report['scenarios'][result_name] = result
+            print("%s: %.3fs" % (result_name, result['time']), file=sys.stderr)
+    
+    shutil.rmtree(fake_bpy.work_dir, ignore_errors=True)
+    
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+    else:
+        json.dump(report, sys.stdout, indent=2, sort_keys=True)
+        print()
@@ -0,0 +1,369 @@
+# ##### BEGIN MIT LICENSE BLOCK #####
+#
+# Copyright (c) 2011 Matt Ebb
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
+#
+# ##### END MIT LICENSE BLOCK #####
+
+import sys
+import math
+import types
+from array import array
+
+from .fake_mathutils import Matrix, Vector
+from . import fake_bpy
+
+# Synthetic scenes for the benchmarks, built from plain arrays through the
+# fake bpy layer. Sizes are given at scale 1.0, and scaled down for quick runs.
+
+def scaled(n, scale, minimum=1):
+    return max(minimum, int(n * scale))
+
+def new_scene(name):
+    fake_bpy.reset_data()
+    bpy = sys.modules['bpy']
+    addon = sys.modules[fake_bpy.addon_name]
+    
+    scene = bpy.types.Scene(name=name)
+    bpy.data.scenes.append(scene)
+    bpy.context.scene = scene
+    
+    scene.world = bpy.types.World(name='World')
+    bpy.data.worlds.append(scene.world)
+    
+    # integrator parameters are normally generated from the world panel
+    world_settings = type(scene.world.renderman)
+    if not hasattr(world_settings, 'integrator2'):
+        shader_class = addon.shader_parameters.shader_class(scene, 'integrator')
+        world_settings.integrator2 = bpy.props.PointerProperty(type=shader_class, name="Shader Params")
+    
+    camera = bpy.types.Camera(name='Camera')
+    scene.camera = add_object(scene, 'Camera', 'CAMERA', camera, location=(0.0, -10.0, 5.0))
+    
+    return scene
+
+def add_object(scene, name, type, data, location=(0.0, 0.0, 0.0)):
+    bpy = sys.modules['bpy']
+    
+    ob = bpy.types.Object(name=name, type=type, data=data)
+    ob.location = Vector(location)
+    ob.matrix_world = Matrix.Translation(location)
+    ob.matrix_local = ob.matrix_world.copy()
+    
+    scene.objects.append(ob)
+    bpy.data.objects.append(ob)
+    return ob
+
+def add_modifier(ob, type):
+    ob.modifiers.append( types.SimpleNamespace(name=type.title(), type=type, show_render=True) )
+
+
+# ------------- Meshes -------------
+
+# an n by n grid of quads, with UVs, and creases around two of its borders
+def grid_mesh(name, n, creases=False):
+    bpy = sys.modules['bpy']
+    row = n + 1
+    nverts = row * row
+    
+    co = array('f')
+    for i in range(row):
+        y = i / n
+        for j in range(row):
+            co.extend( (j / n, y, 0.0) )
+    normal = array('f', [0.0, 0.0, 1.0]) * nverts
+    
+    npolys = n * n
+    vertex_index = array('i')
+    for i in range(n):
+        for j in range(n):
+            a = i * row + j
+            vertex_index.extend( (a, a+1, a+row+1, a+row) )
+    loop_total = array('i', [4]) * npolys
+    loop_start = array('i', range(0, npolys * 4, 4))
+    
+    uv = array('f')
+    for v in vertex_index:
+        uv.extend( (co[v*3], co[v*3+1]) )
+    
+    mesh = bpy.types.Mesh(name=name)
+    mesh.vertices = fake_bpy.ArrayCollection(nverts, co=co, normal=normal)
+    mesh.polygons = fake_bpy.ArrayCollection(npolys, loop_total=loop_total, loop_start=loop_start)
+    mesh.loops = fake_bpy.ArrayCollection(npolys * 4, vertex_index=vertex_index)
+    mesh.uv_layers.active = types.SimpleNamespace(name='UVMap', data=fake_bpy.ArrayCollection(npolys * 4, uv=uv))
+    mesh.uv_layers.append(mesh.uv_layers.active)
+    
+    if creases:
+        edge_verts = array('i')
+        crease = array('f')
+        for i in range(row):
+            for j in range(row):
+                a = i * row + j
+                if j < n:
+                    edge_verts.extend( (a, a+1) )
+                    crease.append(1.0 if i == 0 else 0.0)
+                if i < n:
+                    edge_verts.extend( (a, a+row) )
+                    crease.append(0.5 if j == 0 else 0.0)
+        mesh.edges = fake_bpy.ArrayCollection(len(crease), crease=crease, vertices=edge_verts)
+    
+    bpy.data.meshes.append(mesh)
+    return mesh
+
+# meshes sharing the same geometry arrays, so large scenes are quick to build
+def mesh_instance(name, mesh):
+    bpy = sys.modules['bpy']
+    copy = mesh.evaluated()
+    copy.name = name
+    bpy.data.meshes.append(copy)
+    return copy
+
+def mesh_objects(scene, prefix, count, mesh):
+    side = int(math.ceil(math.sqrt(count)))
+    return [add_object(scene, '%s%04d' % (prefix, i), 'MESH', mesh_instance('%s%04d' % (prefix, i), mesh),
+                       location=(i % side * 2.0, i // side * 2.0, 0.0)) for i in range(count)]
+
+
+# ------------- Particles -------------
+
+def particle_system(name, type, particles):
+    bpy = sys.modules['bpy']
+    settings = bpy.types.ParticleSettings(name=name, type=type)
+    bpy.data.particles.append(settings)
+    return bpy.types.ParticleSystem(name=name, settings=settings, particles=particles)
+
+# hair strands, in a few different shapes shared between strands
+def hair_particles(count, keys):
+    shapes = []
+    for s in range(16):
+        co = array('f')
+        for k in range(keys):
+            t = k / (keys - 1)
+            co.extend( (math.sin(s + t) * 0.1 * t, math.cos(s + t) * 0.1 * t, t) )
+        shapes.append( fake_bpy.ArrayCollection(keys, co=co) )
+    
+    return fake_bpy.ArrayCollection(count, element_attrs={'hair_keys': [shapes[i % 16] for i in range(count)]})
+
+# particles alive on the first frame, except for every tenth one, born later
+def emitter_particles(count):
+    side = int(math.ceil(count ** (1/3.0)))
+    
+    birth_time = array('f', [(10.0 if i % 10 == 9 else 0.0) for i in range(count)])
+    location = array('f')
+    for i in range(count):
+        location.extend( (i % side * 0.1, i // side % side * 0.1, i // (side*side) * 0.1) )
+    rotation = array('f', [1.0, 0.0, 0.0, 0.0]) * count
+    
+    return fake_bpy.ArrayCollection(count,
+            element_attrs={'alive_state': ['ALIVE'] * count},
+            birth_time=birth_time,
+            die_time=array('f', [100.0]) * count,
+            lifetime=array('f', [100.0]) * count,
+            size=array('f', [0.05]) * count,
+            location=location,
+            rotation=rotation,
+            velocity=array('f', [0.0, 0.0, 1.0]) * count,
+            angular_velocity=array('f', [0.0]) * (count * 3))
+
+def emitter_object(scene, name, psys):
+    ob = add_object(scene, name, 'MESH', grid_mesh(name, 1))
+    ob.particle_systems.append(psys)
+    return ob
+
+
+# ------------- Shading -------------
+
+def node_type(shader):
+    addon = sys.modules[fake_bpy.addon_name]
+    prefs = sys.modules['bpy'].context.user_preferences.addons[fake_bpy.addon_name].preferences
+    return addon.nodes.generate_node_type(prefs, shader)
+
+def add_node(nt, ntype, name):
+    node = ntype(name=name)
+    node.init(None)
+    nt.nodes.append(node)
+    return node
+
+def link(nt, from_node, to_node, socket_name):
+    nt.links.new(from_node.outputs[0], to_node.inputs[socket_name], from_node, to_node)
+
+def node_tree(name):
+    bpy = sys.modules['bpy']
+    nt = bpy.types.NodeTree(name=name, bl_idname='RendermanShaderTree')
+    bpy.data.node_groups.append(nt)
+    return nt
+
+# a chain of depth texture coshaders, each correcting the colour of the next,
+# feeding the surface shader's colour
+def surface_node_tree(name, depth):
+    addon = sys.modules[fake_bpy.addon_name]
+    nt = node_tree(name)
+    
+    output = add_node(nt, addon.nodes.OutputShaderNode, 'Output')
+    surface = add_node(nt, node_type('base_surface_simple'), 'Surface')
+    link(nt, surface, output, 'Surface')
+    
+    texture = node_type('texture_cosh')
+    prev, socket = surface, 'color_coshader'
+    for i in range(depth):
+        node = add_node(nt, texture, 'Texture%03d' % i)
+        link(nt, node, prev, socket)
+        prev, socket = node, 'colorcorrect'
+    
+    return nt
+
+def light_node_tree(name, shader):
+    addon = sys.modules[fake_bpy.addon_name]
+    nt = node_tree(name)
+    
+    output = add_node(nt, addon.nodes.OutputLightShaderNode, 'Output')
+    light = add_node(nt, node_type(shader), 'Light')
+    link(nt, light, output, 'LightSource')
+    return nt
+
+def material(name, surface='', nodetree=''):
+    bpy = sys.modules['bpy']
+    mat = bpy.types.Material(name=name)
+    mat.renderman.surface_shaders.active = surface
+    mat.renderman.nodetree = nodetree
+    bpy.data.materials.append(mat)
+    return mat
+
+def lamp_object(scene, name, nodetree, location):
+    bpy = sys.modules['bpy']
+    lamp = bpy.types.Lamp(name=name, type='SPOT')
+    lamp.renderman.nodetree = nodetree
+    bpy.data.lamps.append(lamp)
+    return add_object(scene, name, 'LAMP', lamp, location=location)
+
+
+# ------------- Scenes -------------
+
+def large_mesh_scene(scale):
+    scene = new_scene('large_mesh')
+    add_object(scene, 'Grid', 'MESH', grid_mesh('Grid', scaled(700, math.sqrt(scale), 2)))
+    return scene
+
+def subdivision_scene(scale):
+    scene = new_scene('subdivision')
+    ob = add_object(scene, 'Subd', 'MESH', grid_mesh('Subd', scaled(400, math.sqrt(scale), 2), creases=True))
+    add_modifier(ob, 'SUBSURF')
+    return scene
+
+def many_meshes_scene(scale, name='many_meshes'):
+    scene = new_scene(name)
+    mesh_objects(scene, 'Mesh', scaled(400, scale), grid_mesh('Mesh', 40))
+    return scene
+
+# deforming and moving meshes, sampled for motion blur
+def motion_blur_scene(scale):
+    scene = new_scene('motion_blur')
+    scene.renderman.motion_blur = True
+    scene.renderman.motion_segments = 2
+    
+    for ob in mesh_objects(scene, 'Deform', scaled(100, scale), grid_mesh('Deform', 60)):
+        add_modifier(ob, 'ARMATURE')
+        ob.animation_data = types.SimpleNamespace(action=None)
+    return scene
+
+def hair_scene(scale):
+    scene = new_scene('hair')
+    psys = particle_system('Hair', 'HAIR', hair_particles(scaled(100000, scale), 8))
+    emitter_object(scene, 'Scalp', psys)
+    return scene
+
+def particles_scene(scale):
+    scene = new_scene('particles')
+    psys = particle_system('Points', 'EMITTER', emitter_particles(scaled(500000, scale)))
+    psys.settings.renderman.constant_width = False
+    emitter_object(scene, 'Emitter', psys)
+    return scene
+
+# motion blurred particle instances of an object exported as an archive
+# count overrides the scaled number of particles
+def particle_instances_scene(scale, count=None):
+    scene = new_scene('particle_instances')
+    scene.renderman.motion_blur = True
+    
+    instance = add_object(scene, 'Pebble', 'MESH', grid_mesh('Pebble', 4))
+    instance.renderman.export_archive = True
+    
+    if count is None:
+        count = scaled(50000, scale)
+    psys = particle_system('Instances', 'EMITTER', emitter_particles(count))
+    psys.settings.renderman.particle_type = 'OBJECT'
+    psys.settings.renderman.particle_instance_object = instance.name
+    emitter_object(scene, 'Emitter', psys)
+    return scene
+
+def many_lights_scene(scale):
+    scene = new_scene('many_lights')
+    count = scaled(1000, scale)
+    side = int(math.ceil(math.sqrt(count)))
+    
+    for i in range(count):
+        shader = 'spotLight' if i % 2 == 0 else 'light_distant'
+        name = 'Lamp%04d' % i
+        nt = light_node_tree(name, shader)
+        lamp_object(scene, name, nt.name, location=(i % side * 1.0, i // side * 1.0, 5.0))
+    
+    add_object(scene, 'Ground', 'MESH', grid_mesh('Ground', 10))
+    return scene
+
+def node_trees_scene(scale):
+    scene = new_scene('node_trees')
+    count = scaled(200, scale)
+    depth = 30
+    
+    mesh = grid_mesh('Shaded', 2)
+    for i, ob in enumerate(mesh_objects(scene, 'Shaded', count, mesh)):
+        nt = surface_node_tree('Tree%04d' % i, depth)
+        ob.data.materials = [material('Material%04d' % i, nodetree=nt.name)]
+    return scene
+
+# materials and lamps with shaders assigned, for generating shader parameters.
+# Shaders with coshader parameters list the shaders in the shader paths, from
+# the scene rather than the addon preferences, which fails, so they're left out
+def shader_parameters_scene(scale):
+    scene = new_scene('shader_parameters')
+    
+    surfaces = ('plastic', 'pbr_brdf_specular', 'pbr_btdf_specular')
+    lights = ('light_area', 'light_distant', 'light_env')
+    mesh = grid_mesh('Shaded', 2)
+    for i, ob in enumerate(mesh_objects(scene, 'Shaded', scaled(500, scale), mesh)):
+        ob.data.materials = [material('Material%04d' % i, surface=surfaces[i % len(surfaces)])]
+    
+    for i in range(scaled(100, scale)):
+        ob = lamp_object(scene, 'Lamp%04d' % i, '', location=(i * 1.0, 0.0, 5.0))
+        ob.data.renderman.light_shaders.active = lights[i % len(lights)]
+    
+    return scene
+
+def archive_scene(scale):
+    scene = new_scene('archive')
+    mesh_objects(scene, 'Archived', scaled(20, scale), grid_mesh('Archived', 150))
+    return scene
+
+# many meshes, with geometry written to archives by the worker processes
+def parallel_export_scene(scale):
+    scene = many_meshes_scene(scale, name='parallel_export')
+    scene.renderman.use_parallel_export = True
+    return scene
@@ -0,0 +1,213 @@
+# ##### BEGIN MIT LICENSE BLOCK #####
+#
+# Copyright (c) 2011 Matt Ebb
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
+#
+# ##### END MIT LICENSE BLOCK #####
+
+import re
+import struct
+import sys
+from array import array
+
+from .util import rib_array_is_int
+
+# Binary RIB encoding, as described in the RenderMan Interface spec, appendix C.
+# The exporter keeps writing ASCII RIB text, which is tokenized here and
+# re-encoded, so all the existing export functions can write binary RIB unchanged.
+
+RIB_INT = 0o200
+RIB_STRING_SHORT = 0o220
+RIB_STRING = 0o240
+RIB_FLOAT = 0o244
+RIB_REQUEST = 0o246
+RIB_FLOAT_ARRAY = 0o310
+RIB_DEFINE_REQUEST = 0o314
+
+# whitespace, comments, strings, array delimiters, and everything else
+token_re = re.compile(r'\s+|#[^\n]*(?:\n|$)|"(?:[^"\\]|\\.)*"|\[|\]|[^\s\[\]"#]+', re.S)
+int_re = re.compile(r'[-+]?\d+$')
+escape_re = re.compile(r'\\(.)', re.S)
+escapes = {'n':'\n', 't':'\t', 'r':'\r', 'b':'\b', 'f':'\f', '\n':''}
+
+def length_bytes(n):
+    for w in range(4):
+        if n < 1 << (8 * (w+1)):
+            return w
+    raise ValueError("RIB token too long: %d" % n)
+
+def encode_int(i):
+    for w in range(4):
+        bits = 8 * (w+1)
+        if -(1 << (bits-1)) <= i < 1 << (bits-1):
+            return bytes([RIB_INT + w]) + i.to_bytes(w+1, 'big', signed=True)
+    return encode_float(float(i))
+
+def encode_float(f):
+    return bytes([RIB_FLOAT]) + struct.pack('>f', f)
+
+def encode_string(s):
+    data = s.encode('utf-8')
+    if len(data) < 16:
+        return bytes([RIB_STRING_SHORT + len(data)]) + data
+    w = length_bytes(len(data))
+    return bytes([RIB_STRING + w]) + len(data).to_bytes(w+1, 'big') + data
+
+def encode_float_array_header(n):
+    w = length_bytes(n)
+    return bytes([RIB_FLOAT_ARRAY + w]) + n.to_bytes(w+1, 'big')
+
+def float_array_bytes(v):
+    a = array('f', v)
+    if sys.byteorder == 'little':
+        a.byteswap()
+    return a.tobytes()
+
+def int_array_bytes(v):
+    # every value as a 4 byte integer, interleaved with its type byte
+    a = array('i', v)
+    if sys.byteorder == 'little':
+        a.byteswap()
+    raw = a.tobytes()
+    out = bytearray(len(a) * 5)
+    out[0::5] = bytes([RIB_INT + 3]) * len(a)
+    for k in range(4):
+        out[k+1::5] = raw[k::4]
+    return bytes(out)
+
+def unescape_string(token):
+    return escape_re.sub(lambda m: escapes.get(m.group(1), m.group(1)), token[1:-1])
+
+
+class BinaryRibWriter:
+    ''' File-like object that takes ASCII RIB and writes binary RIB to a file opened in binary mode '''
+
+    chunk_size = 4096
+
+    def __init__(self, file):
+        self.file = file
+        self.name = file.name
+        self.requests = {}
+        self.pending = ''
+        self.array_tokens = None
+
+    def write(self, text):
+        self.pending += text
+        self.tokenize(final=False)
+
+    # write a numeric array directly, bypassing text formatting entirely
+    def write_array(self, v):
+        self.tokenize(final=True)
+
+        if rib_array_is_int(v):
+            self.file.write(b'[')
+            for i in range(0, len(v), self.chunk_size):
+                self.file.write(int_array_bytes(v[i:i+self.chunk_size]))
+            self.file.write(b']')
+        else:
+            self.file.write(encode_float_array_header(len(v)))
+            for i in range(0, len(v), self.chunk_size):
+                self.file.write(float_array_bytes(v[i:i+self.chunk_size]))
+
+    def close(self):
+        self.tokenize(final=True)
+        if self.array_tokens is not None:
+            self.end_array()
+        self.file.close()
+
+    def tokenize(self, final):
+        text = self.pending
+        pos = 0
+        end = len(text)
+
+        while pos < end:
+            m = token_re.match(text, pos)
+
+            # unterminated string, wait for the rest of it
+            if m is None:
+                if final:
+                    raise ValueError("Unterminated string in RIB: %s" % text[pos:pos+64])
+                break
+
+            # token may continue in the next write
+            if m.end() == end and not final and text[pos] not in '"[]' and not text[pos].isspace():
+                if text[pos] != '#' or text[-1] != '\n':
+                    break
+
+            self.token(m.group(0))
+            pos = m.end()
+
+        self.pending = text[pos:]
+
+    def token(self, token):
+        c = token[0]
+
+        if c.isspace() or c == '#':
+            return
+        elif c == '[':
+            if self.array_tokens is not None:
+                raise ValueError("Nested arrays in RIB")
+            self.array_tokens = []
+        elif c == ']':
+            self.end_array()
+        elif self.array_tokens is not None:
+            self.array_tokens.append(token)
+        else:
+            self.file.write(self.encode_token(token))
+
+    def end_array(self):
+        tokens = self.array_tokens
+        self.array_tokens = None
+
+        try:
+            values = [float(t) for t in tokens]
+        except ValueError:
+            values = None
+
+        # arrays with any non-integer numbers are float arrays
+        if values is not None and len(values) > 0 and \
+            not all(int_re.match(t) for t in tokens):
+            self.file.write(encode_float_array_header(len(values)))
+            self.file.write(float_array_bytes(values))
+        else:
+            self.file.write(b'[' + b''.join(self.encode_token(t) for t in tokens) + b']')
+
+    def encode_token(self, token):
+        if token[0] == '"':
+            return encode_string(unescape_string(token))
+        if int_re.match(token):
+            return encode_int(int(token))
+        try:
+            return encode_float(float(token))
+        except ValueError:
+            pass
+
+        # RIB request, defined the first time it's used
+        if token in self.requests:
+            return bytes([RIB_REQUEST, self.requests[token]])
+
+        if len(self.requests) > 255:
+            return token.encode('utf-8') + b'\n'
+
+        code = len(self.requests)
+        self.requests[token] = code
+        return bytes([RIB_DEFINE_REQUEST, code]) + encode_string(token) + \
+                bytes([RIB_REQUEST, code])
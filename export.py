@@ -28,15 +28,21 @@ import bpy_types
 import math
 import os
 import time
+import gzip
+import zlib
+import re
 import subprocess
+import multiprocessing
 import mathutils
-from mathutils import Matrix, Vector, Quaternion
+from array import array
+from mathutils import Matrix
 
 from . import bl_info
 
 from .util import bpy_newer_257
 from .util import BlenderVersionError
 from .util import rib, rib_path, rib_ob_bounds
+from .util import write_rib_array
 from .util import make_frame_path
 from .util import init_env
 from .util import get_sequence_path
@@ -46,6 +52,8 @@ from .util import path_list_convert
 
 addon_version = bl_info['version']
 
+M_SQRT2 = math.sqrt(2.0)
+
 # global dictionaries
 from .shader_parameters import exclude_lamp_params
 
@@ -55,6 +63,7 @@ from .shader_parameters import path_win_to_unixy
 from .shader_parameters import rna_to_shaderparameters
 from .shader_parameters import get_parameters_shaderinfo
 from .shader_parameters import rna_types_initialise
+from .shader_parameters import shader_rna_registry
 
 from .shader_parameters import shader_recompile
 
@@ -65,6 +74,14 @@ from .shader_parameters import tex_optimised_path
 
 from .nodes import export_shader_nodetree
 
+from .binary_rib import BinaryRibWriter
+from .archive_cache import ArchiveHash
+from .archive_cache import get_archive_cache
+from .incremental import export_updates
+from . import incremental
+from .profiler import profiler, profiled
+from .profiler import ProfiledRibWriter
+
 class RPass:    
     def __init__(self, scene, objects=[], paths={}, type="", motion_blur=False):
         
@@ -80,6 +97,9 @@ class RPass:
     
         self.resolution = []
         self.motion_blur = scene.renderman.motion_blur
+        self.incremental = scene.renderman.incremental_export
+        self.geometry_jobs = None
+        self.cache_archives = []
         
         self.surface_shaders = True
         self.displacement_shaders = True
@@ -192,6 +212,7 @@ def make_optimised_texture_3dl(tex, texture_optimiser, srcpath, optpath):
     
     proc = subprocess.Popen(cmd).wait()
 
+@profiled()
 def auto_optimise_textures(paths, scene):
     
     rm_textures = [tex for tex in bpy.data.textures if tex.renderman.auto_generate_texture == True]
@@ -214,6 +235,108 @@ def auto_optimise_textures(paths, scene):
         
         make_optimised_texture_3dl(tex, paths['texture_optimiser'], srcpath, optpath)
 
+# ------------- RIB Output -------------
+
+# totals for all compressed RIB files written during an export
+rib_compression_stats = {}
+
+def reset_rib_compression_stats():
+    rib_compression_stats['files'] = 0
+    rib_compression_stats['bytes_in'] = 0
+    rib_compression_stats['bytes_out'] = 0
+    rib_compression_stats['time'] = 0.0
+
+reset_rib_compression_stats()
+
+def rib_compression_summary():
+    st = rib_compression_stats
+    return "%d RIB files, %.1f MB -> %.1f MB compressed, %.2fs compressing" % \
+        (st['files'], st['bytes_in'] / 1048576.0, st['bytes_out'] / 1048576.0, st['time'])
+
+class GzipRibWriter:
+    ''' Streams RIB through gzip compression, keeping track of sizes and time spent compressing '''
+    
+    buffer_size = 1 << 20
+    
+    def __init__(self, path, level, binary=False):
+        self.name = path
+        self.level = level
+        self.binary = binary
+        self.raw = open(path, "wb")
+        self.gz = gzip.GzipFile(filename=os.path.basename(path), mode="wb", compresslevel=level, fileobj=self.raw)
+        
+        self.buffer = []
+        self.buffered = 0
+        self.bytes_in = 0
+        self.time = 0.0
+    
+    def write(self, data):
+        self.buffer.append(data)
+        self.buffered += len(data)
+        if self.buffered > self.buffer_size:
+            self.flush()
+    
+    def flush(self):
+        if self.binary:
+            data = b''.join(self.buffer)
+        else:
+            data = ''.join(self.buffer).encode('utf-8')
+        self.buffer = []
+        self.buffered = 0
+        self.bytes_in += len(data)
+        
+        start = time.time()
+        self.gz.write(data)
+        self.time += time.time() - start
+    
+    def close(self):
+        self.flush()
+        
+        start = time.time()
+        self.gz.close()
+        self.time += time.time() - start
+        
+        bytes_out = self.raw.tell()
+        self.raw.close()
+        
+        print("Compressed RIB %s: %d -> %d bytes (level %d) in %.3fs" % 
+                (self.name, self.bytes_in, bytes_out, self.level, self.time))
+        
+        rib_compression_stats['files'] += 1
+        rib_compression_stats['bytes_in'] += self.bytes_in
+        rib_compression_stats['bytes_out'] += bytes_out
+        rib_compression_stats['time'] += self.time
+
+# RIB format settings, as a plain dict so files can also be opened outside of Blender
+def rib_output_settings(scene):
+    rm = scene.renderman
+    return {'format': rm.rib_format, 
+            'compression': rm.rib_compression, 
+            'compression_level': rm.rib_compression_level}
+
+# open a RIB file for writing in the format chosen in the scene settings
+def open_rib(scene, path):
+    return open_rib_file(path, rib_output_settings(scene))
+
+def open_rib_file(path, settings):
+    binary = settings['format'] == 'binary'
+    
+    # renderdl detects gzipped RIB by its contents, so the path is left as is
+    # to keep references to archives, shadow map and point cloud RIBs valid
+    if settings['compression']:
+        file = GzipRibWriter(path, settings['compression_level'], binary=binary)
+    elif binary:
+        file = open(path, "wb")
+    else:
+        file = open(path, "w")
+    
+    if binary:
+        file = BinaryRibWriter(file)
+    
+    if profiler.enabled:
+        file = ProfiledRibWriter(file)
+    return file
+
 # ------------- Filtering -------------
 
 def is_visible_layer(scene, ob):
@@ -272,6 +395,12 @@ def archive_objects(scene):
 
 # ------------- Data Access Helpers -------------
 
+# object name made safe to use in file names
+def object_file_name(name):
+    safe_name = re.sub(r'[^\w.-]', '_', name)
+    # keep names that only differ by special characters separate
+    return safe_name + '_%08x' % (zlib.crc32(name.encode('utf-8')) & 0xffffffff)
+
 def get_subframes(segs):
     return [i * 1.0/segs for i in range(segs+1)]
 
@@ -325,79 +454,161 @@ def psys_motion_name(ob, psys):
 
 
 # ------------- Geometry Access -------------
-def get_strands(ob, psys):
-    nstrands = 0
-    nvertices = []
-    P = []
-    
-    for particle in psys.particles:
-        hair = particle.hair_keys
-        nvertices += [len(hair)+2]
-        i=0
+# number of strands per Curves call, so dense hair is extracted and written
+# in batches instead of holding every strand's points in memory at once
+strand_batch_size = 10000
+
+def get_strands(ob, psys, start=0, end=None):
+    particles = psys.particles
+    # the last batch may end past the last particle
+    if end is None or end > len(particles):
+        end = len(particles)
+    
+    nvertices = array('i')
+    P = array('f')
+    co = array('f')
+    
+    for i in range(start, end):
+        hair = particles[i].hair_keys
+        nkeys = len(hair)
+        if nkeys == 0:
+            continue
         
         # hair keys are stored as local offsets from the 
         # particle location (on surface)
-        for key in particle.hair_keys:
-            P.extend( key.co )
-            
-            # double up start and end points
-            if i == 0 or i == len(hair)-1:
-                P.extend( key.co )
-            i += 1
+        if len(co) != nkeys*3:
+            co = array('f', [0.0]) * (nkeys*3)
+        hair.foreach_get('co', co)
+        
+        # double up start and end points
+        P.extend( co[:3] )
+        P.extend( co )
+        P.extend( co[-3:] )
+        nvertices.append( nkeys+2 )
             
     return (nvertices, P)
 
-# only export particles that are alive, 
-# or have been born since the last frame
-def valid_particle(pa, cfra):
-    return not (pa.birth_time > cfra or (pa.birth_time + pa.die_time) < cfra)
-
+class ParticleSnapshot:
+    ''' Attributes of a particle system's valid particles, read in bulk with foreach_get '''
+    
+    def __init__(self, psys, cfra):
+        particles = psys.particles
+        n = len(particles)
+        
+        def read(attr, size):
+            a = array('f', [0.0]) * (n*size)
+            particles.foreach_get(attr, a)
+            return a
+        
+        birth_time = read('birth_time', 1)
+        die_time = read('die_time', 1)
+        
+        # only export particles that are alive, 
+        # or have been born since the last frame
+        self.valid = [i for i in range(n) if not (birth_time[i] > cfra or (birth_time[i] + die_time[i]) < cfra)]
+        self.count = len(self.valid)
+        self.particles = particles
+        self.cfra = cfra
+        
+        def select(a, size):
+            if self.count == n:
+                return a
+            if size == 1:
+                return array('f', map(a.__getitem__, self.valid))
+            return array('f', map(a.__getitem__, [i*size+j for i in self.valid for j in range(size)]))
+        
+        self.birth_time = select(birth_time, 1)
+        self.die_time = select(die_time, 1)
+        self.lifetime = select(read('lifetime', 1), 1)
+        self.size = select(read('size', 1), 1)
+        self.location = select(read('location', 3), 3)
+        self.rotation = select(read('rotation', 4), 4)
+        self.velocity = select(read('velocity', 3), 3)
+        self.angular_velocity = select(read('angular_velocity', 3), 3)
+        
+        self._width = None
+    
+    # size of alive particles, zero for particles that are dying or just born.
+    # alive_state is an enum, which foreach_get can't read, so it's only read when needed
+    @property
+    def width(self):
+        if self._width is None:
+            particles = self.particles
+            self._width = array('f', [s if particles[i].alive_state == 'ALIVE' else 0.0 \
+                                        for i, s in zip(self.valid, self.size)])
+        return self._width
+    
+    @property
+    def age(self):
+        cfra = self.cfra
+        return array('f', [(cfra - b) / l for b, l in zip(self.birth_time, self.lifetime)])
+
+# snapshots for the current frame and subframe, shared by all particle exporters
+particle_snapshots = {'time':None, 'psys':{}}
+
+def reset_particle_snapshots():
+    particle_snapshots['time'] = None
+    particle_snapshots['psys'] = {}
+
+def get_particle_snapshot(scene, ob, psys):
+    cfra = (scene.name, scene.frame_current, scene.frame_subframe)
+    if particle_snapshots['time'] != cfra:
+        reset_particle_snapshots()
+        particle_snapshots['time'] = cfra
+    
+    name = psys_motion_name(ob, psys)
+    if name not in particle_snapshots['psys']:
+        particle_snapshots['psys'][name] = ParticleSnapshot(psys, scene.frame_current)
+    return particle_snapshots['psys'][name]
+
+# the particle indices are included so motion samples can be matched up by particle
 def get_particles(scene, ob, psys):
-    P = []
-    rot = []
-    width = []
-    
-    cfra = scene.frame_current
-    
-    for pa in [p for p in psys.particles if valid_particle(p, cfra)]:
-        
-        P.extend( pa.location )
-        rot.extend( pa.rotation )
-        
-        if pa.alive_state != 'ALIVE':
-            width.append(0.0)
-        else:
-            width.append(pa.size)
-    
-    return (P, rot, width)
+    snapshot = get_particle_snapshot(scene, ob, psys)
+    return (snapshot.location, snapshot.rotation, snapshot.width, snapshot.valid)
 
 # Mesh data access
-def get_mesh(mesh):
-    nverts = []
-    verts = []
-    P = []
-    
-    for v in mesh.vertices:
-        P.extend( v.co )
-  
-    for p in mesh.polygons:
-        nverts.append( p.loop_total )
-        verts.extend( p.vertices )
+# geometry is read in bulk with foreach_get into flat typed arrays,
+# rather than walking vertices and polygons one python object at a time
+def get_mesh_P(mesh):
+    P = array('f', [0.0]) * (len(mesh.vertices) * 3)
+    mesh.vertices.foreach_get('co', P)
+    return P
+
+def get_mesh_topology(mesh):
+    npolys = len(mesh.polygons)
+    nloops = len(mesh.loops)
+    
+    nverts = array('i', [0]) * npolys
+    mesh.polygons.foreach_get('loop_total', nverts)
+    
+    # face vertex indices, taken from the loops in polygon order
+    verts = array('i', [0]) * nloops
+    mesh.loops.foreach_get('vertex_index', verts)
+    
+    # loops are normally stored contiguously in polygon order,
+    # only reorder them in the rare case that they aren't
+    loop_start = array('i', [0]) * npolys
+    mesh.polygons.foreach_get('loop_start', loop_start)
+    
+    start = 0
+    for ls, lt in zip(loop_start, nverts):
+        if ls != start:
+            ordered = array('i')
+            for ls, lt in zip(loop_start, nverts):
+                ordered.extend( verts[ls:ls+lt] )
+            verts = ordered
+            break
+        start += lt
         
-    return (nverts, verts, P)
+    return (nverts, verts)
 
 def get_mesh_vertex_N(mesh):
-    N = []
-    
-    for v in mesh.vertices:
-        N.extend( v.normal )
-    
+    N = array('f', [0.0]) * (len(mesh.vertices) * 3)
+    mesh.vertices.foreach_get('normal', N)
     return N
 
 # requires facevertex interpolation
 def get_mesh_uv(mesh, name=""):
-    uvs = []
-
     if name == "":
         uv_loop_layer = mesh.uv_layers.active
     else:
@@ -408,9 +619,11 @@ def get_mesh_uv(mesh, name=""):
     if uv_loop_layer == None:
         return None
     
-    for uvloop in uv_loop_layer.data:
-        uvs.append( uvloop.uv.x )
-        uvs.append( 1.0 - uvloop.uv.y )     # renderman expects UVs flipped vertically from blender
+    uvs = array('f', [0.0]) * (len(uv_loop_layer.data) * 2)
+    uv_loop_layer.data.foreach_get('uv', uvs)
+    
+    # renderman expects UVs flipped vertically from blender
+    uvs[1::2] = array('f', [1.0 - v for v in uvs[1::2]])
 
     return uvs
 
@@ -418,36 +631,38 @@ def get_mesh_uv(mesh, name=""):
 # requires facevertex interpolation
 def get_mesh_vcol(mesh, name=""):
     vcol_layer = mesh.vertex_colors[name] if name != "" else mesh.vertex_colors.active
-    cols = []
     
     if vcol_layer == None:
         return None
     
-    for vcloop in vcol_layer.data:
-        cols.extend( vcloop.color )
+    cols = array('f', [0.0]) * (len(vcol_layer.data) * 3)
+    vcol_layer.data.foreach_get('color', cols)
     
     return cols
 
 # requires per-vertex interpolation
-def get_mesh_vgroup(ob, mesh, name=""):
-    vgroup = ob.vertex_groups[name] if name != "" else ob.vertex_groups.active
-    weights = []
+# dense weights for several vertex groups, in a single pass over the vertices.
+# vertices that aren't in a group get a weight of 0.0
+def get_mesh_vgroup_weights(mesh, group_indices):
+    nverts = len(mesh.vertices)
+    weights = dict( (index, array('f', [0.0]) * nverts) for index in group_indices )
+    
+    if len(weights) == 0:
+        return weights
+    
+    for i, v in enumerate(mesh.vertices):
+        for g in v.groups:
+            if g.group in weights:
+                weights[g.group][i] = g.weight
     
-    if vgroup == None:
-        return None
-
-    for v in mesh.vertices:
-        if len(v.groups) == 0:
-            weights.append(0.0)
-        else:
-            weights.extend( [g.weight for g in v.groups if g.group == vgroup.index ] )
-            
     return weights
 
-
-def export_primvars(file, ob, geo, interpolation=""):
+# returns a list of (declaration, data) pairs for the mesh's primitive variables
+def get_primvars(ob, geo, interpolation=""):
+    primvars = []
+    
     if ob.type != 'MESH':
-        return
+        return primvars
 
     rm = ob.data.renderman
     
@@ -457,95 +672,139 @@ def export_primvars(file, ob, geo, interpolation=""):
     if rm.export_smooth_normals and ob.renderman.primitive in ('AUTO', 'POLYGON_MESH', 'SUBDIVISION_MESH'):
         N = get_mesh_vertex_N(geo)
         if N is not None:
-            file.write('            "varying normal N" %s \n' % rib(N) )
+            primvars.append( ('varying normal N', N) )
     if rm.export_default_uv:
         uvs = get_mesh_uv(geo)
         if uvs is not None:
-            file.write('            "%s float[2] st" %s \n' % (interpolation, rib(uvs)) )
+            primvars.append( ('%s float[2] st' % interpolation, uvs) )
     if rm.export_default_vcol:
         vcols = get_mesh_vcol(geo)
         if vcols is not None:
-            file.write('            "%s color Cs" %s \n' % (interpolation, rib(vcols)) )
+            primvars.append( ('%s color Cs' % interpolation, vcols) )
+    
+    # all vertex groups used by prim vars are read together
+    vgroups = [ob.vertex_groups.get(p.data_name) if p.data_name != "" else ob.vertex_groups.active \
+                for p in rm.prim_vars if p.data_source == 'VERTEX_GROUP']
+    vgroup_weights = get_mesh_vgroup_weights(geo, set(vg.index for vg in vgroups if vg is not None))
     
     # custom prim vars
     for p in rm.prim_vars:
         if p.data_source == 'VERTEX_COLOR':
             vcols = get_mesh_vcol(geo, p.data_name)
             if vcols is not None:
-                file.write('            "%s color %s" %s \n' % (interpolation, p.name, rib(vcols)) )
+                primvars.append( ('%s color %s' % (interpolation, p.name), vcols) )
 
         elif p.data_source == 'UV_TEXTURE':
             uvs = get_mesh_uv(geo, p.data_name)
             if uvs is not None:
-                file.write('            "%s float[2] %s" %s \n' % (interpolation, p.name, rib(uvs)) )
+                primvars.append( ('%s float[2] %s' % (interpolation, p.name), uvs) )
 
         elif p.data_source == 'VERTEX_GROUP':
-            weights = get_mesh_vgroup(ob, geo, p.data_name)
-            if weights is not None:
-                file.write('            "vertex float %s" %s \n' % (p.name, rib(weights)) )
+            vgroup = ob.vertex_groups.get(p.data_name) if p.data_name != "" else ob.vertex_groups.active
+            if vgroup is not None:
+                primvars.append( ('vertex float %s' % p.name, vgroup_weights[vgroup.index]) )
     
-def export_primvars_particle(file, scene, psys):
+    return primvars
+
+def write_primvars(file, primvars):
+    for decl, data in primvars:
+        write_rib_array(file, '            "%s" ' % decl, data, ' \n')
+
+def export_primvars_particle(file, scene, ob, psys):
     rm = psys.settings.renderman
-    cfra = scene.frame_current
+    snapshot = get_particle_snapshot(scene, ob, psys)
     
     for p in rm.prim_vars:
-        vars = []
-        
         if p.data_source in ('VELOCITY', 'ANGULAR_VELOCITY'):
             if p.data_source == 'VELOCITY':
-                for pa in [p for p in psys.particles if valid_particle(p, cfra)]:
-                    vars.extend ( pa.velocity )
+                vars = snapshot.velocity
             elif p.data_source == 'ANGULAR_VELOCITY':
-                for pa in [p for p in psys.particles if valid_particle(p, cfra)]:
-                    vars.extend ( pa.angular_velocity )
+                vars = snapshot.angular_velocity
 
-            file.write('            "varying float[3] %s" %s \n' % (p.name, rib(vars)) )
+            write_rib_array(file, '            "varying float[3] %s" ' % p.name, vars, ' \n')
 
         elif p.data_source in ('SIZE', 'AGE', 'BIRTH_TIME', 'DIE_TIME', 'LIFE_TIME'):
             if p.data_source == 'SIZE':
-                for pa in [p for p in psys.particles if valid_particle(p, cfra)]:
-                    vars.append ( pa.size )
+                vars = snapshot.size
             elif p.data_source == 'AGE':
-                for pa in [p for p in psys.particles if valid_particle(p, cfra)]:
-                    vars.append ( (cfra - pa.birth_time) / pa.lifetime )
+                vars = snapshot.age
             elif p.data_source == 'BIRTH_TIME':
-                for pa in [p for p in psys.particles if valid_particle(p, cfra)]:
-                    vars.append ( pa.birth_time )
+                vars = snapshot.birth_time
             elif p.data_source == 'DIE_TIME':
-                for pa in [p for p in psys.particles if valid_particle(p, cfra)]:
-                    vars.append ( pa.die_time )
+                vars = snapshot.die_time
             elif p.data_source == 'LIFE_TIME':
-                for pa in [p for p in psys.particles if valid_particle(p, cfra)]:
-                    vars.append ( pa.lifetime )
+                vars = snapshot.lifetime
 
-            file.write('            "varying float %s" %s \n' % (p.name, rib(vars)) )
+            write_rib_array(file, '            "varying float %s" ' % p.name, vars, ' \n')
 
 
-def get_fluid_mesh(scene, ob):
+def get_fluid_mesh(scene, ob, prim):
     
     subframe = scene.frame_subframe
     
     fluidmod = [m for m in ob.modifiers if m.type == 'FLUID_SIMULATION'][0]
     fluidmeshverts = fluidmod.settings.fluid_mesh_vertices
     
-    mesh = create_mesh(scene, ob)
-    (nverts, verts, P) = get_mesh(mesh)
-    bpy.data.meshes.remove(mesh)
+    # the fluid mesh is the same for all subframes, only moved by its velocities
+    data = get_mesh_data(scene, ob, prim, full=False, per_subframe=False)
+    nverts, verts, P = data.get('nverts'), data.get('verts'), data['P']
     
     # use fluid vertex velocity vectors to reconstruct moving points
-    P = [P[i] + fluidmeshverts[int(i/3)].velocity[i%3] * subframe * 0.5 for i in range(len(P))]
+    vel = array('f', [0.0]) * len(P)
+    fluidmeshverts.foreach_get('velocity', vel)
+    fac = subframe * 0.5
+    P = array('f', [p + v * fac for p, v in zip(P, vel)])
     
     return (nverts, verts, P)
     
+# creased edges, merged into chains of connected edges with equal sharpness,
+# as a list of (vertex indices, sharpness) for multi-vertex "crease" tags
 def get_subd_creases(mesh):
-    creases = []
+    nedges = len(mesh.edges)
+    
+    crease = array('f', [0.0]) * nedges
+    mesh.edges.foreach_get('crease', crease)
+    edge_verts = array('i', [0]) * (nedges * 2)
+    mesh.edges.foreach_get('vertices', edge_verts)
+    
+    groups = {}
+    for i, c in enumerate(crease):
+        if c > 0.0:
+            groups.setdefault(c, []).append( (edge_verts[i*2], edge_verts[i*2+1]) )
     
-    # only do creases 1 edge at a time for now, detecting chains might be tricky..
-    for e in mesh.edges:
-        if e.crease > 0.0:
-            creases.append( (e.vertices[0], e.vertices[1], e.crease*e.crease * 10) ) # squared, to match blender appareance better : range 0 - 10 (infinitely sharp)
+    creases = []
+    for c in sorted(groups.keys()):
+        # squared, to match blender appareance better : range 0 - 10 (infinitely sharp)
+        sharpness = c*c * 10
+        for chain in crease_chains(groups[c]):
+            creases.append( (chain, sharpness) )
     return creases
 
+# split edges into as few paths of connected vertices as a simple walk finds
+def crease_chains(edges):
+    adjacent = {}
+    for a, b in edges:
+        adjacent.setdefault(a, []).append(b)
+        adjacent.setdefault(b, []).append(a)
+    
+    # start from chain ends (odd numbers of edges) first, then
+    # whatever is left over are closed loops
+    verts = sorted(adjacent.keys())
+    starts = [v for v in verts if len(adjacent[v]) % 2 == 1] + verts
+    
+    chains = []
+    for start in starts:
+        while len(adjacent[start]) > 0:
+            chain = [start]
+            v = start
+            while len(adjacent[v]) > 0:
+                next = adjacent[v].pop()
+                adjacent[next].remove(v)
+                chain.append(next)
+                v = next
+            chains.append(chain)
+    return chains
+
 def create_mesh(scene, ob, matrix=None):
     # 2 special cases to ignore:
     # subsurf last or subsurf 2nd last +displace last
@@ -557,6 +816,7 @@ def create_mesh(scene, ob, matrix=None):
     #    ob.modifiers[len(ob.modifiers)-1].show_render = False
     
     mesh = ob.to_mesh(scene, True, 'RENDER')    
+    mesh_cache['to_mesh'] += 1
     
     if matrix != None:
         mesh.transform(matrix)
@@ -568,6 +828,81 @@ def create_mesh(scene, ob, matrix=None):
 
 
 
+# Arrays extracted from evaluated meshes on the current frame, keyed by object and subframe.
+# Motion samples, fluid samples and the geometry export of every pass share a single
+# to_mesh() conversion, and the blender mesh itself is freed straight after extraction.
+# Only entries that will be read again are kept: the geometry export frees each mesh
+# once it's done with it, unless later passes on the same frame export it too.
+mesh_cache = {'later_passes': False}
+
+# meshes beyond this many bytes of arrays are extracted again when needed, instead of kept
+mesh_cache_max_size = 512 * 1024 * 1024
+
+def reset_mesh_cache():
+    mesh_cache['frame'] = None
+    mesh_cache['meshes'] = {}
+    mesh_cache['size'] = 0
+
+def reset_mesh_cache_stats():
+    mesh_cache['to_mesh'] = 0
+    mesh_cache['reused'] = 0
+
+reset_mesh_cache()
+reset_mesh_cache_stats()
+
+def mesh_cache_summary():
+    return "Meshes: %d to_mesh conversions, %d reused" % (mesh_cache['to_mesh'], mesh_cache['reused'])
+
+# set while exporting passes before the final one, which export the same meshes again
+def set_mesh_cache_later_passes(later_passes):
+    mesh_cache['later_passes'] = later_passes
+
+# 'full' also extracts creases and primvars, needed on the current frame but not for motion samples.
+# 'keep' leaves the arrays in the cache to be read again, otherwise they're freed after this
+@profiled()
+def get_mesh_data(scene, ob, prim, full=True, per_subframe=True, keep=True):
+    frame = (scene.name, scene.frame_current)
+    if mesh_cache['frame'] != frame:
+        reset_mesh_cache()
+        mesh_cache['frame'] = frame
+    
+    key = (ob.name, prim, scene.frame_subframe if per_subframe else None)
+    data = mesh_cache['meshes'].get(key)
+    if data is not None and (data['full'] or not full):
+        mesh_cache['reused'] += 1
+        if not keep:
+            mesh_cache['size'] -= mesh_cache['meshes'].pop(key)['size']
+        return data
+    
+    mesh = create_mesh(scene, ob)
+    
+    data = {'full': full}
+    data['P'] = get_mesh_P(mesh)
+    if prim != 'POINTS':
+        data['nverts'], data['verts'] = get_mesh_topology(mesh)
+    
+    if full and prim == 'SUBDIVISION_MESH':
+        data['creases'] = get_subd_creases(mesh)
+        data['primvars'] = get_primvars(ob, mesh, "facevertex")
+    elif full and prim != 'POINTS':
+        data['primvars'] = get_primvars(ob, mesh, "facevarying")
+    
+    bpy.data.meshes.remove(mesh)
+    
+    data['size'] = sum(len(data[k]) * data[k].itemsize for k in ('P', 'nverts', 'verts') if k in data)
+    data['size'] += sum(len(d) * d.itemsize for decl, d in data.get('primvars', []))
+    
+    if key in mesh_cache['meshes']:
+        mesh_cache['size'] -= mesh_cache['meshes'].pop(key)['size']
+    if keep and mesh_cache['size'] + data['size'] <= mesh_cache_max_size:
+        mesh_cache['meshes'][key] = data
+        mesh_cache['size'] += data['size']
+    
+    return data
+
+
+
+
 # RIB Exporting functions
 
 def shadowmap_path(scene, ob):
@@ -582,6 +917,7 @@ def shadowmap_path(scene, ob):
     return path
     
 
+@profiled(object_arg=3)
 def export_light(rpass, scene, file, ob):
     lamp = ob.data
     rm = lamp.renderman
@@ -731,6 +1067,7 @@ def export_sss_bake(file, rpass, mat):
     file.write('            "scale" %s \n' % rm.sss_scale)
     file.write('        \n')
     
+@profiled()
 def export_material(file, rpass, scene, mat):
 
     export_sss_bake(file, rpass, mat)
@@ -764,6 +1101,7 @@ def export_material(file, rpass, scene, mat):
     #file.write('        Shader "btdf_specular" "btdf_specular" \n')
 
 
+@profiled()
 def export_strands(file, rpass, scene, ob, motion):
 
     for psys in ob.particle_systems:
@@ -780,24 +1118,37 @@ def export_strands(file, rpass, scene, ob, motion):
                 export_material(file, rpass, scene, mat)
         
         motion_blur = pname in motion['deformation']
-            
+        
         if motion_blur:
-            file.write('        MotionBegin %s\n' % rib(get_ob_subframes(scene, ob)))
             samples = motion['deformation'][pname]
+            subframes = get_ob_subframes(scene, ob)
+            
+            # split the already extracted motion samples into batches
+            nverts = samples[0][0]
+            offset = 0
+            for start in range(0, len(nverts), strand_batch_size):
+                end = min(start + strand_batch_size, len(nverts))
+                batch_end = offset + sum(nverts[start:end]) * 3
+                
+                file.write('        MotionBegin %s\n' % rib(subframes))
+                for sample_nverts, P in samples:
+                    write_strands(file, rm, sample_nverts[start:end], P[offset:batch_end])
+                file.write('        MotionEnd\n')
+                
+                offset = batch_end
         else:
-            samples = [get_strands(ob, psys)]
-        
-        for nverts, P in samples:
-        
-            file.write('    Basis "catmull-rom" 1 "catmull-rom" 1\n')
-            file.write('    Curves "cubic" \n')
-            file.write('        %s \n' % rib(nverts))
-            file.write('        "nonperiodic" \n')
-            file.write('        "P" %s \n' % rib(P))
-            file.write('        "constantwidth" [ %f ] \n' % rm.width)
-
-        if motion_blur:
-            file.write('        MotionEnd\n')
+            for start in range(0, len(psys.particles), strand_batch_size):
+                nverts, P = get_strands(ob, psys, start, start + strand_batch_size)
+                if len(nverts) > 0:
+                    write_strands(file, rm, nverts, P)
+
+def write_strands(file, rm, nverts, P):
+    file.write('    Basis "catmull-rom" 1 "catmull-rom" 1\n')
+    file.write('    Curves "cubic" \n')
+    write_rib_array(file, '        ', nverts, ' \n')
+    file.write('        "nonperiodic" \n')
+    write_rib_array(file, '        "P" ', P, ' \n')
+    file.write('        "constantwidth" [ %f ] \n' % rm.width)
 
 def geometry_source_rib(scene, ob):
     rm = ob.renderman
@@ -851,29 +1202,75 @@ def export_particle_instances(file, rpass, scene, ob, psys, motion):
         instance_geometry_rib = geometry_source_rib(scene, instance_ob)
     
     motion_blur = pname in motion['deformation']
-    cfra = scene.frame_current
-
-    for i in range(len( [ p for p in psys.particles if valid_particle(p, cfra) ] )):
+    
+    if motion_blur:
+        samples = motion['deformation'][pname]
+        subframes = rib(get_ob_subframes(scene, ob))
+    else:
+        samples = [get_particles(scene, ob, psys)]
+    
+    # each sample is converted to instance matrices once, up front,
+    # keyed on particle index so the samples line up when particles
+    # are born or die between subframes
+    sample_matrices = [dict(zip(ids, particle_instance_matrices(P, rot, width))) \
+                                for P, rot, width, ids in samples]
+    
+    # only particles present in every sample can be motion blurred
+    particle_ids = [i for i in samples[0][3] if all(i in mtxs for mtxs in sample_matrices)]
+    
+    # declare the geometry once, so the renderer only reads it a single time
+    if rm.particle_instancing == 'OBJECT_INSTANCE':
+        handle = pname + "_instance"
+        file.write('        ObjectBegin "%s"\n' % handle)
+        file.write( instance_geometry_rib )
+        file.write('        ObjectEnd\n')
+        instance_geometry_rib = '            ObjectInstance "%s"\n' % handle
+    
+    for i in particle_ids:
         
         if motion_blur:
-            file.write('        MotionBegin %s\n' % rib(get_ob_subframes(scene, ob)))
-            samples = motion['deformation'][pname]
-        else:
-            samples = [get_particles(scene, ob, psys)]
+            file.write('        MotionBegin %s\n' % subframes)
         
-        for P, rot, width in samples:
-
-            loc = Vector((P[i*3+0], P[i*3+1], P[i*3+2]))
-            rot = Quaternion((rot[i*4+0], rot[i*4+1], rot[i*4+2], rot[i*4+3]))
-            mtx = Matrix.Translation(loc) * rot.to_matrix().to_4x4() * Matrix.Scale(width[i], 4)
-            
-            file.write('                Transform %s \n' % rib(mtx))
+        for mtxs in sample_matrices:
+            file.write('                Transform %s \n' % mtxs[i])
         
         if motion_blur:
             file.write('            MotionEnd\n')
 
         file.write( instance_geometry_rib )
+
+# RIB transform matrices for particle instances, built straight from the location,
+# rotation quaternion and size arrays rather than through mathutils objects.
+# Equivalent to Translation(loc) * rot.to_matrix() * Scale(width)
+def particle_instance_matrices(P, rot, width):
+    mtxs = []
+    
+    for i in range(len(width)):
+        s = width[i]
+        
+        # quaternion to rotation matrix, as in blender's quat_to_mat3
+        q0 = M_SQRT2 * rot[i*4+0]
+        q1 = M_SQRT2 * rot[i*4+1]
+        q2 = M_SQRT2 * rot[i*4+2]
+        q3 = M_SQRT2 * rot[i*4+3]
         
+        qda = q0*q1
+        qdb = q0*q2
+        qdc = q0*q3
+        qaa = q1*q1
+        qab = q1*q2
+        qac = q1*q3
+        qbb = q2*q2
+        qbc = q2*q3
+        qcc = q3*q3
+        
+        mtxs.append( '[ %f %f %f 0.000000 %f %f %f 0.000000 %f %f %f 0.000000 %f %f %f 1.000000 ]' % \
+            ((1.0-qbb-qcc)*s, (qdc+qab)*s, (qac-qdb)*s,
+             (qab-qdc)*s, (1.0-qaa-qcc)*s, (qda+qbc)*s,
+             (qdb+qac)*s, (qbc-qda)*s, (1.0-qaa-qbb)*s,
+             P[i*3+0], P[i*3+1], P[i*3+2]) )
+    
+    return mtxs
 
 
 def export_particle_points(file, scene, ob, psys, motion):
@@ -888,21 +1285,22 @@ def export_particle_points(file, scene, ob, psys, motion):
     else:
         samples = [get_particles(scene, ob, psys)]
     
-    for P, rot, width in samples:
+    for P, rot, width, ids in samples:
         
         file.write('        Points \n')
-        file.write('            "P" %s \n' % rib(P))
+        write_rib_array(file, '            "P" ', P, ' \n')
         file.write('            "uniform string type" [ "%s" ] \n' % rm.particle_type)
         if rm.constant_width:
             file.write('            "constantwidth" [%f] \n' % rm.width)
         elif rm.export_default_size:
-            file.write('            "varying float width" %s \n' % rib(width))
+            write_rib_array(file, '            "varying float width" ', width, ' \n')
 
-        export_primvars_particle(file, scene, psys)
+        export_primvars_particle(file, scene, ob, psys)
 
     if motion_blur:
         file.write('        MotionEnd\n')
 
+@profiled()
 def export_particles(file, rpass, scene, ob, motion):
 
     for psys in ob.particle_systems:
@@ -947,6 +1345,7 @@ def export_shader_init(file, rpass, mat):
     if rpass.emit_photons:
         file.write('        Attribute "photon" "string shadingmodel" "%s" \n' % rm.photon_shadingmodel)
 
+@profiled()
 def export_shader(file, scene, rpass, idblock, shader_type):
     rm = idblock.renderman
     file.write('\n        # %s\n' % shader_type ) # BBM addition
@@ -1089,6 +1488,7 @@ def get_curve(curve):
 
     return splines
 
+@profiled()
 def export_curve(file, scene, ob, motion):
     if ob.type != 'CURVE':
         return
@@ -1109,104 +1509,103 @@ def export_curve(file, scene, ob, motion):
             file.write('        Curves "cubic" \n')
             file.write('            [ %s ] \n' % rib(npt))
             file.write('            "%s" \n' % period)
-            file.write('            "P" %s \n' % rib(P))
-            file.write('            "width" %s \n' % rib(width))
+            write_rib_array(file, '            "P" ', P, ' \n')
+            write_rib_array(file, '            "width" ', width, ' \n')
             #file.write('        "constantwidth" [ %f ] \n' % 0.2)
             
     if motion_blur:
         file.write('        MotionEnd\n')
 
-def export_subdivision_mesh(file, scene, ob, motion):
-    mesh = create_mesh(scene, ob)
+# Mesh geometry is extracted from Blender into plain arrays first, then written
+# separately, so the writing can also be done in other processes, without bpy.
+@profiled()
+def get_mesh_geometry(scene, ob, motion, prim):
+    rm = ob.renderman
     
-    motion_blur = ob.name in motion['deformation']
+    data = get_mesh_data(scene, ob, prim, keep=mesh_cache['later_passes'])
     
-    if motion_blur:
-        file.write('        MotionBegin %s\n' % rib(get_ob_subframes(scene, ob)))
-        samples = motion['deformation'][ob.name]
-    else:
-        samples = [get_mesh(mesh)]
-    
-    creases = get_subd_creases(mesh)
-    
-    for nverts, verts, P in samples:
-        tags = []
-        nargs = []
-        intargs = []
-        floatargs = []
-
-        file.write('        SubdivisionMesh "catmull-clark" \n')
-        file.write('            %s\n' % rib(nverts))
-        file.write('            %s\n' % rib(verts))
-        if len(creases) > 0:
-            for c in creases:
-                tags.append( '"crease"' )
-                nargs.extend( [2, 1] )
-                intargs.extend( [c[0], c[1]] )
-                floatargs.append( c[2] )
-
-        tags.append('"interpolateboundary"')
-        nargs.extend( [0, 0] )
-        
-        file.write('            %s %s %s %s \n' % (rib(tags), rib(nargs), rib(intargs), rib(floatargs)) )
-                
-        file.write('            "P" %s\n' % rib(P))
-        export_primvars(file, ob, mesh, "facevertex")
-        
-
-    if motion_blur:
-        file.write('        MotionEnd\n')
-            
-    bpy.data.meshes.remove(mesh)
-
-def export_polygon_mesh(file, scene, ob, motion):
-    mesh = create_mesh(scene, ob)
+    geometry = {'prim': prim}
     
-    motion_blur = ob.name in motion['deformation']
+    if ob.name in motion['deformation']:
+        geometry['subframes'] = get_ob_subframes(scene, ob)
+        geometry['samples'] = motion['deformation'][ob.name]
+    else:
+        geometry['samples'] = [(data.get('nverts'), data.get('verts'), data['P'])]
     
-    if motion_blur:
-        file.write('        MotionBegin %s\n' % rib(get_ob_subframes(scene, ob)))
-        samples = motion['deformation'][ob.name]
+    if prim == 'POINTS':
+        geometry['point_type'] = rm.primitive_point_type
+        geometry['point_width'] = rm.primitive_point_width
     else:
-        samples = [get_mesh(mesh)]
-        
-    for nverts, verts, P in samples:
-
-        file.write('        PointsPolygons \n')
-        file.write('            %s\n' % rib(nverts))
-        file.write('            %s\n' % rib(verts))
-        file.write('            "P" %s\n' % rib(P))
-        export_primvars(file, ob, mesh, "facevarying")
-        
-    if motion_blur:
-        file.write('        MotionEnd\n')
-            
-    bpy.data.meshes.remove(mesh)
-
-def export_points(file, scene, ob, motion):
-    rm = ob.renderman
+        geometry['primvars'] = data['primvars']
     
-    mesh = create_mesh(scene, ob)
+    if prim == 'SUBDIVISION_MESH':
+        geometry['creases'] = data['creases']
     
-    motion_blur = ob.name in motion['deformation']
+    return geometry
+
+def write_subdivision_mesh(file, geometry, nverts, verts, P):
+    creases = geometry['creases']
     
-    if motion_blur:
-        file.write('        MotionBegin %s\n' % rib(get_ob_subframes(scene, ob)))
-        samples = motion['deformation'][ob.name]
-    else:
-        samples = [get_mesh(mesh)]
-        
-    for nverts, verts, P in samples:
+    tags = ['"crease"'] * len(creases) + ['"interpolateboundary"']
+    nargs = array('i', [0, 1]) * len(creases) + array('i', [0, 0])
+    nargs[0:len(creases)*2:2] = array('i', [len(chain) for chain, sharpness in creases])
+    intargs = array('i')
+    for chain, sharpness in creases:
+        intargs.extend(chain)
+    floatargs = array('f', [sharpness for chain, sharpness in creases])
 
-        file.write('        Points \n')
-        file.write('            "P" %s\n' % rib(P))
-        file.write('            "uniform string type" [ "%s" ] \n' % rm.primitive_point_type)
-        file.write('            "constantwidth" [ %f ] \n' % rm.primitive_point_width)
+    file.write('        SubdivisionMesh "catmull-clark" \n')
+    write_rib_array(file, '            ', nverts, '\n')
+    write_rib_array(file, '            ', verts, '\n')
+    
+    file.write('            [ %s ] ' % ' '.join(tags))
+    write_rib_array(file, '', nargs, ' ')
+    write_rib_array(file, '', intargs, ' ')
+    write_rib_array(file, '', floatargs, ' \n')
             
+    write_rib_array(file, '            "P" ', P, '\n')
+    write_primvars(file, geometry['primvars'])
+
+def write_polygon_mesh(file, geometry, nverts, verts, P):
+    file.write('        PointsPolygons \n')
+    write_rib_array(file, '            ', nverts, '\n')
+    write_rib_array(file, '            ', verts, '\n')
+    write_rib_array(file, '            "P" ', P, '\n')
+    write_primvars(file, geometry['primvars'])
+
+def write_points(file, geometry, nverts, verts, P):
+    file.write('        Points \n')
+    write_rib_array(file, '            "P" ', P, '\n')
+    file.write('            "uniform string type" [ "%s" ] \n' % geometry['point_type'])
+    file.write('            "constantwidth" [ %f ] \n' % geometry['point_width'])
+
+@profiled()
+def write_mesh_geometry(file, geometry):
+    prim = geometry['prim']
+    motion_blur = 'subframes' in geometry
+    
+    if motion_blur:
+        file.write('        MotionBegin %s\n' % rib(geometry['subframes']))
+    
+    for nverts, verts, P in geometry['samples']:
+        if prim == 'POLYGON_MESH':
+            write_polygon_mesh(file, geometry, nverts, verts, P)
+        elif prim == 'SUBDIVISION_MESH':
+            write_subdivision_mesh(file, geometry, nverts, verts, P)
+        elif prim == 'POINTS':
+            write_points(file, geometry, nverts, verts, P)
+    
     if motion_blur:
         file.write('        MotionEnd\n')
-            
-    bpy.data.meshes.remove(mesh)
+
+# number of values in a geometry dict, as a rough measure of the work to write it
+def mesh_geometry_size(geometry):
+    size = 0
+    for sample in geometry['samples']:
+        size += sum(len(data) for data in sample if data is not None)
+    for decl, data in geometry.get('primvars', []):
+        size += len(data)
+    return size
 
 
 def export_sphere(file, scene, ob, motion):
@@ -1234,9 +1633,220 @@ def export_torus(file, scene, ob, motion):
     file.write('        Torus %f %f %f %f %f \n' %
         (rm.primitive_majorradius, rm.primitive_minorradius, rm.primitive_phimin, rm.primitive_phimax, rm.primitive_sweepangle))
 
+# ------------- Archive Cache -------------
+
+def scene_archive_cache(scene):
+    rm = scene.renderman
+    if not rm.use_archive_cache:
+        return None
+    
+    cache_dir = user_path(rm.path_archive_cache, scene=scene)
+    return get_archive_cache(cache_dir, rm.archive_cache_size * 1024 * 1024)
+
+# cache archives read by each reused RIB file, fragments and auto archives,
+# which need to be kept in the cache for as long as the file is reused
+cache_references = {}
+
+# mark the cache archives read by a RIB file as used by this export,
+# returns False if they're unknown or any have been evicted
+def use_cache_references(scene, path):
+    if path not in cache_references:
+        return False
+    
+    archives = cache_references[path]
+    if len(archives) == 0:
+        return True
+    
+    archive_cache = scene_archive_cache(scene)
+    if archive_cache is None:
+        return False
+    return all([archive_cache.use(p) for p in archives])
+
+# deforming meshes change every frame, so aren't worth caching
+def is_archive_cacheable(ob, motion):
+    return ob.type == 'MESH' and ob.name not in motion['deformation']
+
+# hash everything that contributes to the exported geometry RIB
+def geometry_archive_hash(scene, ob, geometry):
+    h = ArchiveHash()
+    h.add( (scene.renderman.rib_format, scene.renderman.rib_compression) )
+    
+    # modifier stack and material assignment
+    h.add( [(m.name, m.type, m.show_render) for m in ob.modifiers] )
+    h.add( [slot.name for slot in ob.material_slots] )
+    
+    for key in sorted(geometry.keys()):
+        h.add(key)
+        if key == 'samples':
+            for sample in geometry['samples']:
+                for data in sample:
+                    h.add(data)
+        elif key == 'primvars':
+            for decl, data in geometry['primvars']:
+                h.add(decl)
+                h.add(data)
+        else:
+            h.add(geometry[key])
+    
+    return h.hexdigest()
+
+@profiled()
+def export_cached_mesh_geometry(file, rpass, archive_cache, scene, ob, motion, prim):
+    geometry = get_mesh_geometry(scene, ob, motion, prim)
+    key = geometry_archive_hash(scene, ob, geometry)
+    
+    archive_path = archive_cache.lookup(key)
+    
+    if archive_path is None:
+        archive_path = archive_cache.new_path(key)
+        
+        # write to a temporary file first, so an interrupted export 
+        # never leaves an incomplete archive in the cache
+        tmp_path = archive_path + '.tmp'
+        archive_file = open_rib(scene, tmp_path)
+        export_header(archive_file)
+        write_mesh_geometry(archive_file, geometry)
+        archive_file.close()
+        os.replace(tmp_path, archive_path)
+    
+    rpass.cache_archives.append(archive_path)
+    file.write('        ReadArchive "%s"\n' % rib_path(archive_path))
+
+
+# ------------- Parallel Geometry Export -------------
+
+# Mesh geometry can be written to RIB archives by a pool of worker processes.
+# Blender data is only read on the main thread, the workers just get plain arrays.
+# The RIB references the archives in export order, and they are all finished
+# before the RIB is closed and rendered.
+
+# approximate number of values to send to a worker at once
+geometry_chunk_size = 1 << 20
+
+geometry_pool = None
+geometry_pool_processes = 0
+
+def parallel_export_supported():
+    # workers are forked, so they already have the addon modules loaded.
+    # Other start methods would re-import the addon without blender's bpy
+    if hasattr(multiprocessing, 'get_all_start_methods'):
+        return 'fork' in multiprocessing.get_all_start_methods()
+    
+    # before python 3.4, workers are always forked on posix
+    return os.name == 'posix'
+
+def export_processes(scene):
+    processes = scene.renderman.export_processes
+    if processes == 0:
+        processes = multiprocessing.cpu_count()
+    return processes
+
+def get_geometry_pool(processes):
+    global geometry_pool, geometry_pool_processes
+    
+    if geometry_pool is not None and geometry_pool_processes != processes:
+        close_geometry_pool()
+    if geometry_pool is None:
+        if hasattr(multiprocessing, 'get_context'):
+            geometry_pool = multiprocessing.get_context('fork').Pool(processes)
+        else:
+            geometry_pool = multiprocessing.Pool(processes)
+        geometry_pool_processes = processes
+    return geometry_pool
+
+def close_geometry_pool():
+    global geometry_pool
+    
+    if geometry_pool is not None:
+        geometry_pool.close()
+        geometry_pool.join()
+        geometry_pool = None
+
+# runs in a worker process
+def write_geometry_archives(jobs, settings):
+    reset_rib_compression_stats()
+    
+    for path, geometry in jobs:
+        file = open_rib_file(path, settings)
+        export_header(file)
+        write_mesh_geometry(file, geometry)
+        file.close()
+    
+    return dict(rib_compression_stats)
+
+class GeometryJobs:
+    ''' Geometry archives referenced by a single RIB file, written by the worker pool '''
+    
+    def __init__(self, scene, paths, ribpath):
+        name = os.path.splitext(os.path.basename(ribpath))[0]
+        self.dir = os.path.join(paths['export_dir'], "geometry", name)
+        if not os.path.exists(self.dir):
+            os.makedirs(self.dir)
+        
+        self.settings = rib_output_settings(scene)
+        self.processes = export_processes(scene)
+        
+        self.paths = set()
+        self.pending = []
+        self.pending_size = 0
+        self.results = []
+    
+    # duplis and particle instances of the same object share the same archive
+    def archive_path(self, ob, prim):
+        return os.path.join(self.dir, "%s_%s.rib" % (object_file_name(ob.name), prim.lower()))
+    
+    def add(self, path, geometry):
+        self.paths.add(path)
+        self.pending.append( (path, geometry) )
+        self.pending_size += mesh_geometry_size(geometry)
+        
+        if self.pending_size > geometry_chunk_size:
+            self.submit()
+    
+    def submit(self):
+        if len(self.pending) == 0:
+            return
+        
+        pool = get_geometry_pool(self.processes)
+        self.results.append( pool.apply_async(write_geometry_archives, (self.pending, self.settings)) )
+        self.pending = []
+        self.pending_size = 0
+    
+    # wait until all archives are written
+    def finish(self):
+        self.submit()
+        
+        for result in self.results:
+            stats = result.get()
+            for key in stats:
+                rib_compression_stats[key] += stats[key]
+        self.results = []
+
+def begin_geometry_jobs(rpass, scene, ribpath):
+    if scene.renderman.use_parallel_export and parallel_export_supported():
+        rpass.geometry_jobs = GeometryJobs(scene, rpass.paths, ribpath)
+    else:
+        rpass.geometry_jobs = None
+
+def finish_geometry_jobs(rpass):
+    if rpass.geometry_jobs is not None:
+        rpass.geometry_jobs.finish()
+        rpass.geometry_jobs = None
+
+def export_parallel_mesh_geometry(file, rpass, scene, ob, motion, prim):
+    jobs = rpass.geometry_jobs
+    path = jobs.archive_path(ob, prim)
+    
+    if path not in jobs.paths:
+        jobs.add(path, get_mesh_geometry(scene, ob, motion, prim))
+    
+    file.write('        ReadArchive "%s"\n' % rib_path(path))
+
+
 def is_dupli(ob):
     return ob.type == 'EMPTY' and ob.dupli_type != 'NONE'
 
+@profiled()
 def export_geometry_data(file, rpass, scene, ob, motion, force_prim=''):
 
     # handle duplis
@@ -1281,12 +1891,15 @@ def export_geometry_data(file, rpass, scene, ob, motion, force_prim=''):
         export_curve(file, scene, ob, motion) 
         
     # mesh only
-    elif prim == 'POLYGON_MESH':
-        export_polygon_mesh(file, scene, ob, motion)
-    elif prim == 'SUBDIVISION_MESH':
-        export_subdivision_mesh(file, scene, ob, motion)
-    elif prim == 'POINTS':
-        export_points(file, scene, ob, motion)
+    elif prim in ('POLYGON_MESH', 'SUBDIVISION_MESH', 'POINTS'):
+        archive_cache = scene_archive_cache(scene)
+        
+        if archive_cache is not None and is_archive_cacheable(ob, motion):
+            export_cached_mesh_geometry(file, rpass, archive_cache, scene, ob, motion, prim)
+        elif rpass.geometry_jobs is not None:
+            export_parallel_mesh_geometry(file, rpass, scene, ob, motion, prim)
+        else:
+            write_mesh_geometry(file, get_mesh_geometry(scene, ob, motion, prim))
   
 def export_geometry(file, rpass, scene, ob, motion):
     rm = ob.renderman
@@ -1303,6 +1916,7 @@ def export_geometry(file, rpass, scene, ob, motion):
         file.write(geometry_source_rib(scene, ob))
 
 
+@profiled(object_arg=3)
 def export_object(file, rpass, scene, ob, motion):
     rm = ob.renderman
 
@@ -1432,16 +2046,18 @@ def export_motion_ob(scene, motion, ob):
             if ob.name not in motion['deformation'].keys():
                 motion['deformation'][ob.name] = []
             
-            motion['deformation'][ob.name].insert(0, get_fluid_mesh(scene, ob))          
+            motion['deformation'][ob.name].insert(0, get_fluid_mesh(scene, ob, prim))          
         
         # deformation animation
         if is_deforming(ob):
             if ob.name not in motion['deformation'].keys():
                 motion['deformation'][ob.name] = []
             
-            mesh = create_mesh(scene, ob)
-            motion['deformation'][ob.name].insert(0, get_mesh(mesh))
-            bpy.data.meshes.remove(mesh)
+            # the sample on the current frame is also used for the rest of the geometry export,
+            # the others are kept in the motion cache
+            current = scene.frame_subframe == 0.0
+            data = get_mesh_data(scene, ob, prim, full=current, keep=current)
+            motion['deformation'][ob.name].insert(0, (data.get('nverts'), data.get('verts'), data['P']))
 
     # not working yet, needs access to post-deform-modifier curve data
     elif prim == 'CURVE':
@@ -1451,14 +2067,61 @@ def export_motion_ob(scene, motion, ob):
             
             motion['deformation'][ob.name].insert(0, get_curve(ob.data))
 
+# Motion samples for the current frame, shared by all the passes exported for it,
+# so shadow map and archive passes don't re-evaluate the same subframes again.
+class MotionCache:
+
+    def __init__(self):
+        self.reset()
+        self.reset_stats()
+
+    def reset(self):
+        self.frame = None
+        self.motion = empty_motion()
+        # names of objects already sampled, per number of motion segments
+        self.sampled = {}
+
+    def reset_stats(self):
+        self.frame_sets = 0
+        self.frame_sets_saved = 0
+        # scene evaluations done for each frame
+        self.evaluations = {}
+
+    def set_frame(self, scene):
+        frame = (scene.name, scene.frame_current)
+        if self.frame != frame:
+            self.reset()
+            self.frame = frame
+
+    def count_evaluation(self, frame):
+        self.frame_sets += 1
+        self.evaluations[frame] = self.evaluations.get(frame, 0) + 1
+
+    # merge newly sampled motion, keeping existing samples of objects 
+    # that were already reached through another object's duplis
+    def add(self, segs_obs, motion):
+        for segs, motion_obs in segs_obs.items():
+            self.sampled.setdefault(segs, set()).update(ob.name for ob in motion_obs)
+        for key in ('transformation', 'deformation'):
+            for name, samples in motion[key].items():
+                self.motion[key].setdefault(name, samples)
+
+    def summary(self):
+        return "Motion: %d scene evaluations in %d frames, %d saved" % \
+            (self.frame_sets, len(self.evaluations), self.frame_sets_saved)
+
+
+motion_cache = MotionCache()
+
 # Collect and store motion blur transformation data in a pre-process.
 # More efficient, and avoids too many frame updates in blender.
+@profiled()
 def export_motion(rpass, scene):
-    motion = empty_motion()
-    origframe = scene.frame_current
-    
     if not rpass.motion_blur:
-        return motion
+        return empty_motion()
+    
+    origframe = scene.frame_current
+    motion_cache.set_frame(scene)
 
     # get a de-duplicated set of all possible numbers of motion segments 
     # from renderable objects in the scene, and global scene settings
@@ -1466,26 +2129,75 @@ def export_motion(rpass, scene):
     all_segs.append(scene.renderman.motion_segments)
     all_segs = set(all_segs)
     
-    # the aim here is to do only a minimal number of scene updates, 
-    # so we process objects in batches of equal numbers of segments
-    # and update the scene only once for each of those unique fractional frames per segment set
+    # objects to sample for each number of segments, 
+    # skipping objects already sampled by a previous pass on this frame
+    segs_obs = {}
+    requested = 0
     for segs in all_segs:
-
         if segs == scene.renderman.motion_segments:
             motion_obs = [ob for ob in rpass.objects if not ob.renderman.motion_segments_override]
         else:
             motion_obs = [ob for ob in rpass.objects if ob.renderman.motion_segments == segs]
-
-        # prepare list of frames/sub-frames in advance, ordered from future to present,
-        # to prevent too many scene updates (since loop ends on current frame/subframe)
+        
+        # scene updates needed to sample these objects on their own
+        if len(motion_obs) > 0:
+            requested += len(get_subframes(segs))
+        
+        sampled = motion_cache.sampled.get(segs, set())
+        motion_obs = [ob for ob in motion_obs if ob.name not in sampled]
+        if len(motion_obs) > 0:
+            segs_obs[segs] = motion_obs
+    
+    # the aim here is to do only a minimal number of scene updates, so the 
+    # subframes needed by all segment counts are merged, and the scene is updated 
+    # only once for each unique subframe. Equal fractions like 1/2 and 2/4 give 
+    # identical floats, since each is a single correctly rounded division.
+    subframe_obs = {}
+    for segs, motion_obs in segs_obs.items():
         for sub in get_subframes(segs):
-            scene.frame_set(origframe, 1.0-sub)
-            
-            for ob in motion_obs:
-                export_motion_ob(scene, motion, ob)
+            subframe_obs.setdefault(1.0-sub, []).extend(motion_obs)
+    
+    # only count updates that would have sampled something
+    motion_cache.frame_sets_saved += requested - len(subframe_obs)
+    
+    motion = empty_motion()
+    
+    # ordered from future to present, to prevent too many scene updates 
+    # (since loop ends on current frame/subframe), and so samples
+    # inserted at the start of each object's list end up in time order
+    for subframe in sorted(subframe_obs.keys(), reverse=True):
+        scene.frame_set(origframe, subframe)
+        motion_cache.count_evaluation(origframe)
+        
+        for ob in subframe_obs[subframe]:
+            export_motion_ob(scene, motion, ob)
+    
+    motion_cache.add(segs_obs, motion)
                         
-    return motion
+    return motion_cache.motion
+
 
+# Per-object RIB fragment, reused by incremental exports while the object is unchanged
+def fragment_path(rpass, ob):
+    return os.path.join(rpass.paths['export_dir'], "fragments", rpass.type, object_file_name(ob.name) + ".rib")
+
+def export_object_fragment(file, rpass, scene, ob, motion):
+    if ob.type in ('LAMP', 'CAMERA'): return
+    
+    path = fragment_path(rpass, ob)
+    
+    if export_updates.object_is_dirty(ob) or not os.path.exists(path) or \
+        not use_cache_references(scene, path):
+        if not os.path.exists(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        
+        rpass.cache_archives = []
+        fragment_file = open_rib(scene, path)
+        export_object(fragment_file, rpass, scene, ob, motion)
+        fragment_file.close()
+        cache_references[path] = rpass.cache_archives
+    
+    file.write('    ReadArchive "%s"\n' % rib_path(path))
 
 def export_objects(file, rpass, scene, motion):
 
@@ -1493,15 +2205,29 @@ def export_objects(file, rpass, scene, motion):
 
     # export the objects to RIB recursively
     for ob in rpass.objects:
-        export_object(file, rpass, scene, ob, motion)
+        if rpass.incremental:
+            export_object_fragment(file, rpass, scene, ob, motion)
+        else:
+            export_object(file, rpass, scene, ob, motion)
 
 
-def export_archive(scene, objects, filepath="", archive_motion=True, animated=True, frame_start=1, frame_end=3):
+@profiled()
+def export_archive(scene, objects, filepath="", archive_motion=True, animated=True, frame_start=1, frame_end=3, reuse_motion=False):
 
     init_env(scene)
     paths = initialise_paths(scene)    
     rpass = RPass(scene, objects, paths)
     
+    # motion samples are only reused within the same export
+    if not reuse_motion:
+        motion_cache.reset()
+        reset_particle_snapshots()
+        reset_mesh_cache()
+        
+        archive_cache = scene_archive_cache(scene)
+        if archive_cache is not None:
+            archive_cache.begin()
+    
     if frame_start == frame_end:
         animated = False
     
@@ -1515,13 +2241,26 @@ def export_archive(scene, objects, filepath="", archive_motion=True, animated=Tr
         ribpath = anim_archive_path(filepath, frame) if animated else filepath
 
         
-        file = open(ribpath, "w")
+        file = open_rib(scene, ribpath)
         export_header(file)
+        begin_geometry_jobs(rpass, scene, ribpath)
+        rpass.cache_archives = []
         
         for ob in rpass.objects:
             export_geometry_data(file, rpass, scene, ob, motion)
     
+        finish_geometry_jobs(rpass)
         file.close()
+        cache_references[ribpath] = rpass.cache_archives
+    
+    close_geometry_pool()
+    
+    # auto archives written during a render export are 
+    # evicted along with the rest, once the export is finished
+    if not reuse_motion:
+        archive_cache = scene_archive_cache(scene)
+        if archive_cache is not None:
+            archive_cache.evict()
     
     return file.name
 
@@ -1843,6 +2582,7 @@ def shadowmap_generate_required(scene, ob):
     return False
 
 
+@profiled()
 def make_ptc_indirect(paths, scene, info_callback):
     if not ptc_generate_required(scene):
         return
@@ -1861,7 +2601,13 @@ def make_ptc_indirect(paths, scene, info_callback):
     if not os.path.exists(paths['pointcloud_dir']):
         os.mkdir(paths['pointcloud_dir'])
 
-    file = open(ptc_rib, "w")
+    # reuse the existing point cloud if nothing has changed
+    if rpass.incremental and os.path.exists(paths['gi_ptc_bake_path']) and \
+        not export_updates.any_dirty(rpass.objects):
+        return
+
+    file = open_rib(scene, ptc_rib)
+    begin_geometry_jobs(rpass, scene, ptc_rib)
     
     motion = empty_motion()
     
@@ -1896,6 +2642,7 @@ def make_ptc_indirect(paths, scene, info_callback):
     file.write('WorldEnd\n\n')
     file.write('FrameEnd\n\n')
     
+    finish_geometry_jobs(rpass)
     file.close()
     
     # render and bake the pointcloud
@@ -1903,6 +2650,7 @@ def make_ptc_indirect(paths, scene, info_callback):
     # bake3d() doesn't seem to like baking windows absolute paths, so we use relative
     proc = subprocess.Popen([rpass.paths['rman_binary'], ptc_rib], cwd=rpass.paths['export_dir']).wait()
 
+@profiled()
 def make_shadowmaps(paths, scene, info_callback):
 
     info_callback('Creating Shadow maps')
@@ -1922,8 +2670,14 @@ def make_shadowmaps(paths, scene, info_callback):
         if not os.path.exists(rpass.paths['shadowmap_dir']):
             os.mkdir(rpass.paths['shadowmap_dir'])
         
+        # reuse the existing shadow map if nothing has changed
+        if rpass.incremental and os.path.exists(paths['shadow_map']) and \
+            not export_updates.any_dirty(rpass.objects):
+            continue
+        
         shadow_rib = os.path.splitext(paths['shadow_map'])[0] + '.rib'
-        file = open(shadow_rib, "w")
+        file = open_rib(scene, shadow_rib)
+        begin_geometry_jobs(rpass, scene, shadow_rib)
         
         export_header(file)
         export_searchpaths(file, rpass.paths)
@@ -1950,6 +2704,7 @@ def make_shadowmaps(paths, scene, info_callback):
         file.write('WorldEnd\n\n')
         file.write('FrameEnd\n\n')
         
+        finish_geometry_jobs(rpass)
         file.close()
         
         # render the shadow map
@@ -2113,13 +2868,15 @@ def export_inline_rib(file, rpass, scene, lamp=None ):
 
     file.write( '\n' )
 
+@profiled()
 def write_rib(rpass, scene, info_callback):
     info_callback('Generating RIB')
     
     # precalculate motion blur data
     motion = export_motion(rpass, scene)
     
-    file = open(rpass.paths['rib_output'], "w")
+    file = open_rib(scene, rpass.paths['rib_output'])
+    begin_geometry_jobs(rpass, scene, rpass.paths['rib_output'])
     
     export_header(file)
     export_searchpaths(file, rpass.paths)
@@ -2146,6 +2903,9 @@ def write_rib(rpass, scene, info_callback):
     file.write('WorldEnd\n\n')
 
     file.write('FrameEnd\n\n')
+    
+    finish_geometry_jobs(rpass)
+    file.close()
 
 def initialise_paths(scene):
     paths = {}
@@ -2196,9 +2956,14 @@ def export_ptc(scene, objects, filepath=""):
     file.close()
 '''    
 
+@profiled()
 def write_auto_archives(paths, scene, info_callback):
     for ob in archive_objects(scene):
-        export_archive(scene, [ob], archive_motion=True, frame_start=scene.frame_current, frame_end=scene.frame_current)
+        path = auto_archive_path(paths, [ob])
+        if scene.renderman.incremental_export and not export_updates.object_is_dirty(ob) and \
+            os.path.exists(path) and use_cache_references(scene, path):
+            continue
+        export_archive(scene, [ob], archive_motion=True, frame_start=scene.frame_current, frame_end=scene.frame_current, reuse_motion=True)
     
 
 def available_licenses():
@@ -2248,21 +3013,76 @@ def update_scene(engine, data, scene):
     
     init_env(scene)
     
+    profiler.enabled = scene.renderman.use_export_profiling
+    profiler.reset()
+    
     engine.rpass = RPass(scene, renderable_objects(scene), initialise_paths(scene))
+    
+    export_updates.begin(scene, engine.rpass.paths['export_dir'], engine.rpass.incremental)
 
     def info_callback(txt):
         engine.update_stats("", "3Delight: " + txt)
     
     auto_optimise_textures(engine.rpass.paths, scene)
 
+    shader_rna_registry.reset_stats()
     rna_types_initialise(scene)
 
+    reset_rib_compression_stats()
+    
+    motion_cache.reset()
+    motion_cache.reset_stats()
+    reset_particle_snapshots()
+    reset_mesh_cache()
+    reset_mesh_cache_stats()
+    
+    archive_cache = scene_archive_cache(scene)
+    if archive_cache is not None:
+        archive_cache.begin()
+
+    set_mesh_cache_later_passes(True)
     write_auto_archives(engine.rpass.paths, scene, info_callback)
 
     make_ptc_indirect(engine.rpass.paths, scene, info_callback)
     make_shadowmaps(engine.rpass.paths, scene, info_callback)
     
+    set_mesh_cache_later_passes(False)
     write_rib(engine.rpass, scene, info_callback)
+    
+    close_geometry_pool()
+    
+    export_updates.end(engine.rpass.incremental)
+
+    stats = []
+    
+    if shader_rna_registry.registered + shader_rna_registry.reused > 0:
+        stats.append(shader_rna_registry.summary())
+    
+    if scene.renderman.rib_compression:
+        stats.append(rib_compression_summary())
+    
+    if motion_cache.frame_sets > 0:
+        stats.append(motion_cache.summary())
+    
+    if mesh_cache['to_mesh'] > 0:
+        stats.append(mesh_cache_summary())
+    
+    if archive_cache is not None:
+        archive_cache.evict()
+        stats.append(archive_cache.summary())
+    
+    # profile report goes next to the RIB
+    if profiler.enabled:
+        profiler.enabled = False
+        info = {'addon_version': '.'.join(str(v) for v in addon_version), 
+                'blender_version': bpy.app.version_string, 
+                'scene': scene.name, 
+                'frame': scene.frame_current}
+        profiler.write_report(os.path.splitext(engine.rpass.paths['rib_output'])[0] + '_profile.json', info)
+        stats.append(profiler.summary())
+    
+    if len(stats) > 0:
+        info_callback(', '.join(stats))
 
     engine.rpass.do_render = True if scene.renderman.output_action == 'EXPORT_RENDER' else False
 
@@ -2366,9 +3186,10 @@ def render_rib(engine):
 
 
 def register():
-    pass
+    incremental.register()
      #bpy.utils.register_module(__name__)
 
 def unregister():
-    pass
+    close_geometry_pool()
+    incremental.unregister()
      #bpy.utils.unregister_module(__name__)
\ No newline at end of file
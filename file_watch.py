@@ -0,0 +1,138 @@
+# ##### BEGIN MIT LICENSE BLOCK #####
+#
+# Copyright (c) 2012 Matt Ebb
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+# 
+#
+# ##### END MIT LICENSE BLOCK #####
+
+import os
+import sys
+import errno
+import struct
+import ctypes
+import ctypes.util
+
+# Watching directories for changed files with linux inotify, through libc with ctypes.
+# Elsewhere create_watcher() returns None, and callers fall back to polling.
+
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+watch_mask = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | \
+             IN_DELETE_SELF | IN_MOVE_SELF
+
+event_header = struct.Struct('iIII')
+
+class InotifyWatcher:
+    
+    def __init__(self):
+        self.libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        
+        self.fd = self.libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        
+        # watch descriptor -> directory, and back
+        self.dirs = {}
+        self.paths = {}
+    
+    # start watching a directory, returns False if it can't be watched (yet)
+    def add(self, d):
+        if d in self.paths:
+            return True
+        
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(d), watch_mask)
+        if wd < 0:
+            return False
+        
+        self.dirs[wd] = d
+        self.paths[d] = wd
+        return True
+    
+    def remove(self, wd):
+        d = self.dirs.pop(wd, None)
+        if d is not None:
+            self.paths.pop(d, None)
+    
+    # files changed since the last call, or None if changes may have been
+    # missed, and everything should be checked again. Directories that were
+    # deleted or moved away are no longer watched, and need to be added again
+    def changes(self):
+        changed = set()
+        complete = True
+        
+        while True:
+            try:
+                data = os.read(self.fd, 65536)
+            except OSError as e:
+                if e.errno in (errno.EAGAIN, errno.EWOULDBLOCK):
+                    break
+                raise
+            
+            pos = 0
+            while pos < len(data):
+                wd, mask, cookie, length = event_header.unpack_from(data, pos)
+                pos += event_header.size
+                name = data[pos:pos+length].rstrip(b'\0')
+                pos += length
+                
+                if mask & IN_Q_OVERFLOW:
+                    complete = False
+                elif mask & (IN_IGNORED | IN_DELETE_SELF):
+                    # watch removed by the kernel
+                    self.remove(wd)
+                    complete = False
+                elif mask & IN_MOVE_SELF:
+                    # the watch would follow the directory to its new name
+                    self.libc.inotify_rm_watch(self.fd, wd)
+                    self.remove(wd)
+                    complete = False
+                elif wd in self.dirs and name:
+                    changed.add( os.path.join(self.dirs[wd], os.fsdecode(name)) )
+        
+        return changed if complete else None
+    
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+        self.dirs = {}
+        self.paths = {}
+
+
+# returns a watcher with no directories added yet, or None if there's no inotify
+def create_watcher():
+    if not sys.platform.startswith('linux'):
+        return None
+    try:
+        return InotifyWatcher()
+    except (OSError, AttributeError):
+        return None
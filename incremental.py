@@ -0,0 +1,148 @@
+# ##### BEGIN MIT LICENSE BLOCK #####
+#
+# Copyright (c) 2011 Matt Ebb
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
+#
+# ##### END MIT LICENSE BLOCK #####
+
+import bpy
+from bpy.app.handlers import persistent
+
+# Tracking of datablocks changed since the last export, for incremental re-export.
+# Blender flags updated datablocks with is_updated / is_updated_data after each
+# scene update, these are collected here until the next export consumes them.
+
+class ExportUpdates:
+
+    def __init__(self):
+        self.objects = set()
+        self.materials = set()
+        self.lamps = set()
+        self.node_groups = set()
+
+        # everything is considered changed until a complete incremental export is done
+        self.all_dirty = True
+        self.exporting = False
+
+        self.frame = None
+        self.export_dir = None
+
+    def clear(self):
+        self.objects.clear()
+        self.materials.clear()
+        self.lamps.clear()
+        self.node_groups.clear()
+
+    def collect(self):
+        if self.exporting:
+            return
+
+        # scene settings affect everything
+        if bpy.data.scenes.is_updated and any(s.is_updated for s in bpy.data.scenes):
+            self.all_dirty = True
+
+        if bpy.data.objects.is_updated:
+            for ob in bpy.data.objects:
+                if ob.is_updated or ob.is_updated_data:
+                    self.objects.add(ob.name)
+
+        for collection, names in ((bpy.data.materials, self.materials),
+                                  (bpy.data.lamps, self.lamps),
+                                  (bpy.data.node_groups, self.node_groups)):
+            if collection.is_updated:
+                for id in collection:
+                    if id.is_updated or id.is_updated_data:
+                        names.add(id.name)
+
+    def begin(self, scene, export_dir, incremental):
+        # a previous export that didn't finish may have left fragments incomplete
+        if self.exporting:
+            self.all_dirty = True
+        self.exporting = True
+
+        # changing frame can change anything
+        if not incremental or self.frame != scene.frame_current or self.export_dir != export_dir:
+            self.all_dirty = True
+
+        self.frame = scene.frame_current
+        self.export_dir = export_dir
+
+    def end(self, incremental):
+        self.clear()
+        self.all_dirty = not incremental
+        self.exporting = False
+
+    def material_is_dirty(self, mat):
+        if mat is None:
+            return False
+        if mat.name in self.materials:
+            return True
+        return mat.renderman.nodetree != '' and mat.renderman.nodetree in self.node_groups
+
+    def object_is_dirty(self, ob):
+        if self.all_dirty:
+            return True
+        if ob.name in self.objects:
+            return True
+
+        if ob.data is not None and hasattr(ob.data, "materials"):
+            for mat in ob.data.materials:
+                if self.material_is_dirty(mat):
+                    return True
+
+        # dupli objects and particle instances contain other objects
+        if ob.dupli_type != 'NONE' or len(ob.particle_systems) > 0:
+            return len(self.objects) > 0
+
+        return False
+
+    def lamp_is_dirty(self, ob):
+        return self.object_is_dirty(ob) or ob.data.name in self.lamps
+
+    def any_dirty(self, objects):
+        if self.all_dirty:
+            return True
+        return any(self.lamp_is_dirty(ob) if ob.type == 'LAMP' else self.object_is_dirty(ob) \
+                    for ob in objects)
+
+
+export_updates = ExportUpdates()
+
+
+@persistent
+def scene_update_handler(scene):
+    export_updates.collect()
+
+@persistent
+def load_post_handler(dummy):
+    export_updates.clear()
+    export_updates.all_dirty = True
+
+
+def register():
+    bpy.app.handlers.scene_update_post.append(scene_update_handler)
+    bpy.app.handlers.load_post.append(load_post_handler)
+
+def unregister():
+    if scene_update_handler in bpy.app.handlers.scene_update_post:
+        bpy.app.handlers.scene_update_post.remove(scene_update_handler)
+    if load_post_handler in bpy.app.handlers.load_post:
+        bpy.app.handlers.load_post.remove(load_post_handler)
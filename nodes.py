@@ -28,6 +28,7 @@ from .shader_parameters import class_add_parameters
 from .shader_parameters import get_parameters_shaderinfo
 from .shader_parameters import ptr_to_shaderparameters
 from .shader_scan import shaders_in_path
+from .shader_info import save_shader_info_cache
 from .util import get_path_list
 from .util import rib
 
@@ -130,20 +131,34 @@ class OutputLightShaderNode(bpy.types.Node, RendermanShaderNode):
 
 # Generate dynamic types
 
+# A node type is registered for every shader in the shader paths at startup, so
+# nodes in saved files keep their types, but reading each shader's parameters
+# is left until a node of that type is added, loaded from a file or exported.
+# Blender doesn't allow properties to be added while drawing, so the draw
+# callbacks only show parameters that have already been read.
+
+def shader_path_list():
+    prefs = bpy.context.user_preferences.addons[__package__].preferences
+    return get_path_list(prefs, 'shader')
+
 def generate_node_type(prefs, name):
     ''' Dynamically generate a node type from shader '''
 
-    path_list = get_path_list(prefs, 'shader')
-    name, parameters = get_parameters_shaderinfo(path_list, name, '')
+    typename = '%sShaderNode' % name[:16]
+    if typename in RendermanShaderTree.nodetypes:
+        return RendermanShaderTree.nodetypes[typename]
 
     # print('generating node: %s' % name)
 
-    typename = '%sShaderNode' % name[:16]
     ntype = type(typename, (bpy.types.Node, RendermanShaderNode), {})
     ntype.bl_label = name
     ntype.typename = typename
+    ntype.parameters = None
+    ntype.prop_names = []
 
     def init(self, context):
+        parameters = node_type_parameters(ntype)
+
         self.outputs.new('RendermanShaderSocket', "Shader")
         for sp in [p for p in parameters if p.data_type == 'shader']:
             if sp.meta['array']:
@@ -155,7 +170,7 @@ def generate_node_type(prefs, name):
         #for p in self.prop_names:
         #    layout.prop(self, p)
 
-        for sp in [p for p in parameters if p.meta['array']]:
+        for sp in [p for p in (ntype.parameters or []) if p.meta['array']]:
             row = layout.row(align=True)
             row.label(sp.name)
             row.operator("node.add_array_socket", text='', icon='ZOOMIN').array_name = sp.name
@@ -174,15 +189,34 @@ def generate_node_type(prefs, name):
     ntype.draw_buttons_ext = draw_buttons_ext
     
     ntype.shader_name = bpy.props.StringProperty(name='Shader Name', default=name, options={'HIDDEN'})
-    ntype.prop_names = class_add_parameters(ntype, [p for p in parameters if p.data_type != 'shader'])
     bpy.utils.register_class(ntype)
 
-    print(ntype, ntype.bl_rna.identifier)
-
     RendermanShaderTree.nodetypes[typename] = ntype
+    return ntype
 
+# read the shader's parameters and add them to the node type, the first time they're needed
+def node_type_parameters(ntype):
+    if ntype.parameters is None:
+        name, parameters = get_parameters_shaderinfo(shader_path_list(), ntype.bl_label, '')
+        ntype.parameters = parameters
+        ntype.prop_names = class_add_parameters(ntype, [p for p in parameters if p.data_type != 'shader'])
+    return ntype.parameters
 
+# remove the parameters read before, so they're read again from a recompiled shader
+def reset_node_type_parameters(ntype):
+    for p in ntype.prop_names:
+        delattr(ntype, p)
+    ntype.parameters = None
+    ntype.prop_names = []
 
+def load_node_parameters(node):
+    ntype = RendermanShaderTree.nodetypes.get(node.bl_idname)
+    if ntype is not None:
+        node_type_parameters(ntype)
+
+def node_parameters_loaded(node):
+    ntype = RendermanShaderTree.nodetypes.get(node.bl_idname)
+    return ntype is None or ntype.parameters is not None
 
 
 
@@ -233,7 +267,11 @@ def draw_node_properties_recursive(layout, context, nt, node, level=0):
             layout.label('',icon='BLANK1')
         layout.label(label)
     
-    # node properties
+    # node properties, unless the node's type was registered after the file was loaded
+    if not node_parameters_loaded(node):
+        layout.context_pointer_set("node", node)
+        layout.operator('node.load_shader_parameters', icon='FILE_REFRESH')
+
     for p in node.prop_names:
         split = layout.split(NODE_LAYOUT_SPLIT)
         row = split.row()
@@ -350,6 +388,12 @@ class NODE_OT_refresh_shader_parameters(bpy.types.Operator):
     
     def execute(self, context):
         node = context.node
+        ntype = RendermanShaderTree.nodetypes.get(node.bl_idname)
+        if ntype is None:
+            return {'CANCELLED'}
+
+        reset_node_type_parameters(ntype)
+
         for i in node.inputs:
             node.inputs.remove(i)
         for o in node.outputs:
@@ -357,6 +401,14 @@ class NODE_OT_refresh_shader_parameters(bpy.types.Operator):
 
         node.init(context)
         return {'FINISHED'}
+
+class NODE_OT_load_shader_parameters(bpy.types.Operator):
+    bl_idname = 'node.load_shader_parameters'
+    bl_label = 'Load Shader Parameters'
+    
+    def execute(self, context):
+        load_node_parameters(context.node)
+        return {'FINISHED'}
     
 
 def rindex(l, item):
@@ -432,6 +484,7 @@ def shader_node_rib(file, scene, nt, node, shader_type='Shader', handle=None):
     file.write('\n')
 
     # Export built in parameters
+    load_node_parameters(node)
     parameterlist = ptr_to_shaderparameters(scene, node)
     for sp in parameterlist:
         file.write('            "%s %s" %s\n' % (sp.data_type, sp.name, rib(sp.value)))
@@ -509,16 +562,27 @@ def init():
 
     for s in shaders_in_path(prefs, None, threaded=False):
         generate_node_type(prefs, s)
+    
+    save_shader_info_cache()
 
     from bpy.app.handlers import persistent
 
+    # add types for shaders found since, before the file's nodes are read
     @persistent
     def load_handler(dummy):
-        scene = bpy.data.scenes[0]
         for s in shaders_in_path(prefs, None, threaded=False):
-
             generate_node_type(prefs, s)
+        
+        save_shader_info_cache()
 
-    bpy.app.handlers.load_post.append(load_handler)
-    bpy.app.handlers.load_pre.append(load_handler)
+    # read parameters for the node types used in the file, so they can be drawn
+    @persistent
+    def load_post_handler(dummy):
+        for nt in bpy.data.node_groups:
+            if nt.bl_idname != 'RendermanShaderTree':
+                continue
+            for node in nt.nodes:
+                load_node_parameters(node)
 
+    bpy.app.handlers.load_pre.append(load_handler)
+    bpy.app.handlers.load_post.append(load_post_handler)
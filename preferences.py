@@ -111,6 +111,16 @@ class RendermanPreferences(AddonPreferences):
                 subtype='FILE_PATH',
                 default="tdlmake")
     
+    shader_scan_workers = IntProperty(
+                name="Shader Scan Workers",
+                description="Number of shaderinfo processes run at once when scanning shader paths. 0 uses one per core",
+                min=0, max=64, default=0)
+    
+    use_sdl_reader = BoolProperty(
+                name="Read Compiled Shaders Directly",
+                description="Read shader parameters and annotations from compiled shader files, only running shaderinfo for shaders that can't be read",
+                default=True)
+    
                 
     env_vars = PointerProperty(
                 type=RendermanEnvVarSettings,
@@ -139,6 +149,8 @@ class RendermanPreferences(AddonPreferences):
         layout.prop(self, "path_shader_compiler")
         layout.prop(self, "path_shader_info")
         layout.prop(self, "path_texture_optimiser")
+        layout.prop(self, "shader_scan_workers")
+        layout.prop(self, "use_sdl_reader")
 
         env = self.env_vars
         
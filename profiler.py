@@ -0,0 +1,153 @@
+# ##### BEGIN MIT LICENSE BLOCK #####
+#
+# Copyright (c) 2011 Matt Ebb
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
+#
+# ##### END MIT LICENSE BLOCK #####
+
+import sys
+import json
+import time
+import functools
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# Export profiling, recording wall time, call counts and RIB bytes written
+# for each profiled export function and each exported object.
+# Times and bytes are inclusive of nested calls. Recursive calls of a function
+# (like export_object for duplis) are only counted once, in the outermost call.
+
+# peak resident memory of the process in bytes, or None where it can't be measured
+def peak_memory():
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on linux, bytes on mac
+    return rss if sys.platform == 'darwin' else rss * 1024
+
+
+class ExportProfiler:
+
+    def __init__(self):
+        self.enabled = False
+        self.reset()
+
+    def reset(self):
+        self.functions = {}
+        self.objects = {}
+        self.active = {}
+        self.bytes = 0
+        self.start = time.time()
+
+    def record(self, table, key, elapsed, nbytes):
+        entry = table.setdefault(key, {'calls': 0, 'time': 0.0, 'bytes': 0, 'peak_memory': None})
+        entry['calls'] += 1
+        entry['time'] += elapsed
+        entry['bytes'] += nbytes
+        # process peak so far, showing which step the memory use grew in
+        entry['peak_memory'] = peak_memory()
+
+    def call(self, name, func, args, kwargs, object_arg):
+        keys = [(self.functions, name)]
+        if object_arg is not None:
+            keys.append( (self.objects, args[object_arg].name) )
+        
+        outermost = []
+        for table, key in keys:
+            depth = self.active.get((id(table), key), 0)
+            outermost.append(depth == 0)
+            self.active[(id(table), key)] = depth + 1
+        
+        start = time.time()
+        start_bytes = self.bytes
+        try:
+            return func(*args, **kwargs)
+        finally:
+            elapsed = time.time() - start
+            nbytes = self.bytes - start_bytes
+            
+            for (table, key), outer in zip(keys, outermost):
+                self.active[(id(table), key)] -= 1
+                if outer:
+                    self.record(table, key, elapsed, nbytes)
+                else:
+                    self.record(table, key, 0.0, 0)
+
+    # info identifies the run, for comparing reports across versions and scenes
+    def report(self, info={}):
+        report = dict(info)
+        report.update({'total_time': time.time() - self.start,
+                       'bytes': self.bytes,
+                       'peak_memory': peak_memory(),
+                       'functions': self.functions,
+                       'objects': self.objects})
+        return report
+
+    def write_report(self, path, info={}):
+        with open(path, 'w') as f:
+            json.dump(self.report(info), f, indent=2, sort_keys=True)
+
+    # the slowest few functions, for showing in the render stats
+    def summary(self, count=3):
+        slowest = sorted(self.functions.items(), key=lambda item: item[1]['time'], reverse=True)[:count]
+        return "Profile: " + ', '.join("%s %.2fs" % (name, entry['time']) for name, entry in slowest)
+
+
+profiler = ExportProfiler()
+
+# decorator for export functions to profile.
+# object_arg is the index of an object argument, to also record time per object
+def profiled(object_arg=None):
+    def decorator(func):
+        name = func.__name__
+        
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not profiler.enabled:
+                return func(*args, **kwargs)
+            return profiler.call(name, func, args, kwargs, object_arg)
+        
+        return wrapper
+    return decorator
+
+
+class ProfiledRibWriter:
+    ''' Counts the RIB written to a file, before binary encoding or compression '''
+
+    def __init__(self, file):
+        self.file = file
+        self.name = file.name
+        if hasattr(file, 'write_array'):
+            self.write_array = self._write_array
+
+    def write(self, data):
+        profiler.bytes += len(data)
+        self.file.write(data)
+
+    def _write_array(self, v):
+        profiler.bytes += len(v) * 4
+        self.file.write_array(v)
+
+    def close(self):
+        self.file.close()
@@ -388,6 +388,56 @@ class RendermanSceneSettings(bpy.types.PropertyGroup):
                 subtype='FILE_PATH',
                 default="$OUT/{scene}.rib")
     
+    rib_format = EnumProperty(
+                name="RIB Format",
+                description="Encoding to use for exported RIB files",
+                items=[('ascii', 'ASCII', 'Human readable RIB text'),
+                    ('binary', 'Binary', 'Binary encoded RIB, smaller and faster to write and parse, useful for geometry heavy scenes')],
+                default='ascii')
+    
+    rib_compression = BoolProperty(
+                name="Compress RIB",
+                description="Stream RIB files and archives through gzip compression. Reduces file I/O at the expense of export time",
+                default=False)
+    rib_compression_level = IntProperty(
+                name="Compression Level",
+                description="Gzip compression level, from fastest (1) to smallest (9)",
+                min=1, max=9, default=6)
+    
+    use_archive_cache = BoolProperty(
+                name="Cache Geometry Archives",
+                description="Write mesh geometry to archives named by a hash of their contents, and reuse them on later exports while the geometry is unchanged",
+                default=False)
+    path_archive_cache = StringProperty(
+                name="Archive Cache Path",
+                description="Directory to store cached geometry archives",
+                subtype='DIR_PATH',
+                default="$ARC/cache")
+    archive_cache_size = IntProperty(
+                name="Cache Size (MB)",
+                description="Maximum size of the archive cache on disk. Least recently used archives are removed beyond this size",
+                min=1, default=2048)
+    
+    incremental_export = BoolProperty(
+                name="Incremental Export",
+                description="Only re-export objects, lights and materials that changed since the last render, reusing previously written per-object RIB fragments",
+                default=False)
+    
+    use_parallel_export = BoolProperty(
+                name="Parallel Geometry Export",
+                description="Write mesh geometry to RIB archives in multiple processes, using all the cores. Not available on Windows",
+                default=False)
+    
+    export_processes = IntProperty(
+                name="Processes",
+                description="Number of processes writing geometry archives. 0 uses one process per core",
+                min=0, max=256, default=0)
+    
+    use_export_profiling = BoolProperty(
+                name="Profile Export",
+                description="Record time, calls and RIB size for each export function and object, and write a JSON report next to the RIB file",
+                default=False)
+    
     output_action = EnumProperty(
                 name="Action",
                 description="Action to take when rendering",
@@ -1054,6 +1104,13 @@ class RendermanParticleSettings(bpy.types.PropertyGroup):
                 description="Object to instance on every particle",
                 default="")
 
+    particle_instancing = EnumProperty(
+                name="Instancing",
+                description="How the instance object is written for each particle",
+                items=[('ARCHIVE', 'Archive', 'Read the instance object\'s archive again for every particle'),
+                        ('OBJECT_INSTANCE', 'Object Instance', 'Declare the instance object once with ObjectBegin, and reference it with ObjectInstance for every particle')],
+                default='ARCHIVE')
+
     constant_width = BoolProperty(
                 name="Constant Width",
                 description="Override particle sizes with constant width value",
@@ -0,0 +1,246 @@
+# ##### BEGIN MIT LICENSE BLOCK #####
+#
+# Copyright (c) 2011 Matt Ebb
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
+#
+# ##### END MIT LICENSE BLOCK #####
+
+import os
+import re
+import base64
+import binascii
+
+# Reads shader metadata straight from the header of a compiled 3Delight shader,
+# giving the same info as shaderinfo without running it. Only what's been seen
+# in practice is understood: anything else returns None, and shaderinfo is used.
+
+sdl_magic = b'\x7f3dl'
+
+shader_types = {0:'surface', 3:'light', 6:'shader'}
+data_types = {1:'float', 2:'point', 3:'color', 4:'string', 8:'vector', 9:'normal', 13:'shader'}
+
+# the shader global variables come first in the symbol table, one usage flag each
+num_globals = 28
+
+# opcodes used to initialise parameters to constant defaults
+OP_MOVE_FLOAT = 1
+OP_PROMOTE_TRIPLE = 4
+OP_MOVE_STRING = 7
+OP_MOVE_SHADER = 8
+OP_BUILD_TRIPLE = 9
+
+string_re = re.compile(r'"((?:[^"\\]|\\.)*)"')
+escape_re = re.compile(r'\\(.)')
+
+class SdlFormatError(Exception):
+    pass
+
+
+def unquote(s):
+    m = string_re.match(s)
+    if m is None:
+        raise SdlFormatError("Expected string: %s" % s)
+    return escape_re.sub(lambda e: {'n':'\n', 't':'\t'}.get(e.group(1), e.group(1)), m.group(1))
+
+def format_float(s):
+    return '%g' % float(s)
+
+
+class SdlLines:
+    ''' Cursor over the lines of a compiled shader '''
+    
+    def __init__(self, lines, pos=0):
+        self.lines = lines
+        self.pos = pos
+    
+    def next(self):
+        if self.pos >= len(self.lines):
+            raise SdlFormatError("Unexpected end of file")
+        line = self.lines[self.pos]
+        self.pos += 1
+        return line
+    
+    def next_int(self):
+        try:
+            return int(self.next())
+        except ValueError:
+            raise SdlFormatError("Expected integer at line %d" % self.pos)
+    
+    def blank(self):
+        if self.next().strip() != '':
+            raise SdlFormatError("Expected blank line at line %d" % self.pos)
+    
+    # block of code: its length in ints, the instructions a line each,
+    # then the offset where each instruction ends
+    def code_block(self):
+        length = self.next_int()
+        self.blank()
+        
+        code = []
+        while sum(len(i) for i in code) < length:
+            code.append([int(v) for v in self.next().split()])
+        self.blank()
+        
+        if self.next_int() > 0:
+            self.next()
+        self.blank()
+        return code
+
+
+def parse_constant(line):
+    items = line.split(None, 2)
+    if len(items) < 3:
+        raise SdlFormatError("Bad constant: %s" % line)
+    
+    data_type = int(items[1])
+    if data_type == 1:
+        return data_type, format_float(items[2])
+    elif data_type == 3:
+        return data_type, ' '.join(format_float(v) for v in items[2].split())
+    elif data_type == 4:
+        return data_type, unquote(items[2])
+    return data_type, None
+
+def parse_parameter(line):
+    m = string_re.match(line)
+    if m is None:
+        raise SdlFormatError("Bad parameter: %s" % line)
+    
+    rest = line[m.end():].strip()
+    space = string_re.match(rest)
+    if space is None:
+        raise SdlFormatError("Bad parameter: %s" % line)
+    fields = [int(v) for v in rest[space.end():].split()]
+    
+    return {'name': m.group(1),
+            'data_type': fields[1],
+            'array': fields[2] != 0}
+
+# default value of a parameter from its initialisation code, or None if
+# it's anything more than a constant
+def parameter_default(param, code, symbol, constants):
+    if data_types[param['data_type']] == 'shader':
+        return ''
+    if len(code) != 1 or code[0][1] != symbol:
+        return None
+    
+    op = code[0][0]
+    try:
+        args = [constants[s - num_globals] for s in code[0][2:]]
+    except IndexError:
+        return None
+    if any(a[1] is None for a in args):
+        return None
+    
+    if op in (OP_MOVE_FLOAT, OP_MOVE_STRING) and len(args) == 1:
+        return args[0][1]
+    elif op == OP_PROMOTE_TRIPLE and len(args) == 1 and args[0][0] == 1:
+        return ' '.join([args[0][1]] * 3)
+    elif op == OP_BUILD_TRIPLE and len(args) == 3 and all(a[0] == 1 for a in args):
+        return ' '.join(a[1] for a in args)
+    return None
+
+def parse_annotations(lines, pos):
+    cursor = SdlLines(lines, pos)
+    annotations = []
+    for i in range(cursor.next_int()):
+        name = unquote(cursor.next())
+        try:
+            value = base64.b64decode(unquote(cursor.next())).decode()
+        except (binascii.Error, UnicodeDecodeError):
+            raise SdlFormatError("Bad annotation for %s" % name)
+        annotations.append('"%s" "%s"' % (name, value))
+    
+    # same trailing empty line as split shaderinfo -a output
+    annotations.append('')
+    return annotations
+
+def parse_sdl(filename, data):
+    lines = data.decode('latin-1').split('\n')
+    
+    sections = {}
+    for i, l in enumerate(lines):
+        if l.startswith('%'):
+            sections[l.split()[0]] = i + 1
+    if '%code' not in sections or not lines[sections['%code']-1].startswith('%code 7 '):
+        raise SdlFormatError("Unsupported shader format")
+    
+    cursor = SdlLines(lines, sections['%code'])
+    sdl_type = shader_types.get(cursor.next_int())
+    if sdl_type is None:
+        return None
+    cursor.blank()
+    cursor.pos += num_globals
+    
+    constants = [parse_constant(cursor.next()) for i in range(cursor.next_int())]
+    params = [parse_parameter(cursor.next()) for i in range(cursor.next_int())]
+    
+    # skip ahead to the initialisation code, one block per parameter
+    while lines[cursor.pos].strip() != '' or lines[cursor.pos+1].strip() != '':
+        cursor.pos += 1
+    cursor.pos += 2
+    
+    param_info = []
+    symbol = num_globals + len(constants)
+    for param in params:
+        if param['data_type'] not in data_types:
+            return None
+        # XXX only arrays of shaders are flagged as arrays, like with shaderinfo
+        if param['array'] and data_types[param['data_type']] != 'shader':
+            return None
+        
+        default = parameter_default(param, cursor.code_block(), symbol, constants)
+        if default is None:
+            return None
+        
+        param_info.append( {'name': param['name'],
+                            'data_type': data_types[param['data_type']],
+                            'default': default,
+                            'array': param['array']
+                            } )
+        symbol += 1
+    
+    if '%comment-user' in sections:
+        annotations = parse_annotations(lines, sections['%comment-user'])
+    else:
+        annotations = ['']
+    
+    # shaderinfo names shaders after their file
+    return {'name': os.path.splitext(os.path.basename(filename))[0],
+            'type': sdl_type,
+            'params': param_info,
+            'annotations': annotations}
+
+# returns the same info as run_shaderinfo, or None if the shader can't be read here
+def read_sdl(filename):
+    try:
+        with open(filename, 'rb') as f:
+            data = f.read()
+    except (IOError, OSError):
+        return None
+    
+    if not data.startswith(sdl_magic):
+        return None
+    
+    try:
+        return parse_sdl(filename, data)
+    except (SdlFormatError, ValueError, IndexError, KeyError):
+        return None
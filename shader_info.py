@@ -0,0 +1,261 @@
+# ##### BEGIN MIT LICENSE BLOCK #####
+#
+# Copyright (c) 2011 Matt Ebb
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
+#
+# ##### END MIT LICENSE BLOCK #####
+
+import os
+import json
+import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import bpy
+from .sdl_reader import read_sdl
+
+# Shader metadata from compiled shader files, read directly by sdl_reader where
+# possible, otherwise from 3Delight's shaderinfo, parsed once per file.
+# Results are kept in memory and in a file in the user config directory, keyed
+# by path and checked against the file's modification time and size, so
+# shaderinfo only runs again for shaders that have been recompiled.
+
+shader_info_version = 1
+
+# most files passed to one shaderinfo call, to stay well inside command line limits
+shaderinfo_batch_size = 64
+
+class ShaderInfoCache:
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.shaders = None
+        self.dirty = False
+
+    def load(self, cache_path):
+        self.shaders = {}
+        try:
+            with open(cache_path) as f:
+                data = json.load(f)
+        except (IOError, OSError, ValueError):
+            return
+        
+        if data.get('version') == shader_info_version:
+            self.shaders = data['shaders']
+
+    def save(self, cache_path):
+        with self.lock:
+            if not self.dirty:
+                return
+            
+            path = cache_path
+            try:
+                with open(path + '.tmp', 'w') as f:
+                    json.dump({'version': shader_info_version, 'shaders': self.shaders}, f)
+                os.replace(path + '.tmp', path)
+            except (IOError, OSError):
+                return
+            self.dirty = False
+
+    # returns the parsed shader info for each compiled shader file, or None if it isn't valid.
+    # files that aren't cached are read with batched shaderinfo calls, on several threads.
+    # settings come from shader_info_settings(), since this may run in a background thread
+    def get_many(self, filenames, settings, workers=1):
+        stats = {}
+        for filename in filenames:
+            try:
+                stats[filename] = os.stat(filename)
+            except OSError:
+                pass
+        
+        infos = {}
+        missing = []
+        with self.lock:
+            if self.shaders is None:
+                self.load(settings['cache_path'])
+            
+            for filename, st in stats.items():
+                entry = self.shaders.get(filename)
+                if entry is not None and entry['mtime'] == st.st_mtime and entry['size'] == st.st_size:
+                    infos[filename] = entry['info']
+                else:
+                    missing.append(filename)
+        
+        # read shaders outside the lock, so the background shader scan
+        # doesn't hold up the interface
+        read = {}
+        if len(missing) > 0 and settings['use_sdl_reader']:
+            for filename in missing:
+                info = read_sdl(filename)
+                if info is not None:
+                    read[filename] = info
+            missing = [f for f in missing if f not in read]
+        
+        # shaderinfo for everything that couldn't be read directly
+        if len(missing) > 0:
+            missing.sort()
+            size = min(shaderinfo_batch_size, -(-len(missing) // workers))
+            batches = [missing[i:i+size] for i in range(0, len(missing), size)]
+            
+            try:
+                with ThreadPoolExecutor(max_workers=workers) as executor:
+                    results = list(executor.map(run_shaderinfo_batch, batches))
+            except OSError:
+                # shaderinfo isn't available, don't remember anything from it
+                results = []
+            
+            for batch, batch_infos in zip(batches, results):
+                read.update(zip(batch, batch_infos))
+        
+        if len(read) > 0:
+            with self.lock:
+                for filename, info in read.items():
+                    st = stats[filename]
+                    self.shaders[filename] = {'mtime': st.st_mtime, 'size': st.st_size, 'info': info}
+                self.dirty = True
+            infos.update(read)
+        
+        return [infos.get(filename) for filename in filenames]
+
+    def get(self, filename, settings):
+        return self.get_many([filename], settings)[0]
+
+
+shader_info_cache = ShaderInfoCache()
+
+# settings from blender, read on the main thread and passed along to the cache,
+# since bpy can't be used safely from the background shader scan
+def shader_info_settings():
+    try:
+        use_sdl_reader = bpy.context.user_preferences.addons[__package__].preferences.use_sdl_reader
+    except (AttributeError, KeyError):
+        use_sdl_reader = True
+    
+    config_dir = bpy.utils.user_resource('CONFIG', path=__package__, create=True)
+    return {'use_sdl_reader': use_sdl_reader,
+            'cache_path': os.path.join(config_dir, "shaderinfo_cache.json")}
+
+def shaderinfo_output(flag, filenames, stderr=None):
+    if isinstance(filenames, str):
+        filenames = [filenames]
+    output = subprocess.check_output(["shaderinfo", flag] + filenames, stderr=stderr).decode().split('\n')
+    return [o.replace('\r', '') for o in output]
+
+# split shaderinfo -t output for several shaders into the rows of each shader:
+# its name, its type, the number of parameters, then a row per parameter
+def split_tabular_output(output):
+    rows = [l.split(',') for l in output if l != '']
+    shaders = []
+    i = 0
+    while i < len(rows):
+        if i + 2 >= len(rows):
+            raise ValueError("Incomplete shaderinfo output")
+        end = i + 3 + int(rows[i+2][0])
+        shaders.append(rows[i:end])
+        i = end
+    return shaders
+
+# split shaderinfo -d output for several shaders into the lines of each shader,
+# each starts with an unindented declaration followed by indented parameters
+def split_declaration_output(output):
+    shaders = []
+    for l in output:
+        if l == '':
+            continue
+        if not l[0].isspace():
+            shaders.append([])
+        elif len(shaders) == 0:
+            raise ValueError("Unexpected shaderinfo output")
+        shaders[-1].append(l)
+    return shaders
+
+# shader info from the -t rows, -d lines and -a output of one shader
+def parse_shaderinfo(output, output_d, annotations):
+    if len(output) < 2:
+        return None
+    
+    # note:
+    # shaderinfo -t parameters are offset by 3
+    # shaderinfo -d parameters offset by 1
+    params = []
+    output_d = output_d[1:]
+    for i,l in enumerate(output[3:]):
+        params.append( {'name': l[0],
+                        'data_type': l[3],
+                        'default': l[6],
+                        'array': ('shader[' in output_d[i])
+                        } )
+    
+    return {'name': output[0][0],
+            'type': output[1][0],
+            'params': params,
+            'annotations': annotations}
+
+def run_shaderinfo(filename):
+    try:
+        output = shaderinfo_output("-t", filename)
+        output_d = shaderinfo_output("-d", filename)
+        annotations = shaderinfo_output("-a", filename, stderr=subprocess.STDOUT)
+    except subprocess.CalledProcessError:
+        return None
+    
+    output = [l.split(',') for l in output if l != '']
+    return parse_shaderinfo(output, output_d, annotations)
+
+# read several shaders with one shaderinfo call per flag where the output can be
+# split back up. annotations don't say which shader they belong to, so -a still
+# runs per file
+def run_shaderinfo_batch(filenames):
+    if len(filenames) == 1:
+        return [run_shaderinfo(filenames[0])]
+    
+    try:
+        tabular = split_tabular_output(shaderinfo_output("-t", filenames))
+        declarations = split_declaration_output(shaderinfo_output("-d", filenames))
+    except (subprocess.CalledProcessError, ValueError, IndexError):
+        tabular = declarations = None
+    
+    # an invalid shader fails the whole call, or the output doesn't match up
+    # with the files, so go through them one at a time instead
+    if tabular is None or len(tabular) != len(filenames) or len(declarations) != len(filenames):
+        return [run_shaderinfo(f) for f in filenames]
+    
+    infos = []
+    for filename, output, output_d in zip(filenames, tabular, declarations):
+        try:
+            annotations = shaderinfo_output("-a", filename, stderr=subprocess.STDOUT)
+        except subprocess.CalledProcessError:
+            infos.append(None)
+            continue
+        infos.append(parse_shaderinfo(output, output_d, annotations))
+    return infos
+
+# main thread only, background threads pass in settings read beforehand
+def get_shader_info(filename):
+    return shader_info_cache.get(filename, shader_info_settings())
+
+def get_shader_infos(filenames, settings, workers=1):
+    return shader_info_cache.get_many(filenames, settings, workers)
+
+def save_shader_info_cache(settings=None):
+    if settings is None:
+        settings = shader_info_settings()
+    shader_info_cache.save(settings['cache_path'])
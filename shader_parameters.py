@@ -36,6 +36,10 @@ from .util import user_path
 from .util import get_sequence_path
 
 from .shader_scan import shaders_in_path
+from .shader_info import get_shader_info
+from .shader_info import save_shader_info_cache
+
+from .profiler import profiled
 
 #import properties_shader
 from .properties_shader import RendermanCoshader
@@ -226,15 +230,8 @@ def shader_filename(shader_path_list, shadername):
        
         if not os.path.exists(filename):
             continue
-            
-        try:
-            output = subprocess.check_output(["shaderinfo", "-t", filename]).decode().split('\n')
-        except subprocess.CalledProcessError:
-            continue
-
-        output = [o.replace('\r', '') for o in output]
         
-        if len(output) > 1:
+        if get_shader_info(filename) is not None:
             return filename
 
     return None
@@ -268,30 +265,12 @@ def get_3dl_shaderinfo(shader_path_list, shader_name):
     
     if filename == None:
         return (None, None)
-        
-    try:
-        output = subprocess.check_output(["shaderinfo", "-t", filename]).decode().split('\n')
-        output_d = subprocess.check_output(["shaderinfo", "-d", filename]).decode().split('\n')
-    except subprocess.CalledProcessError:
+    
+    info = get_shader_info(filename)
+    if info is None:
         return (None, None)
     
-    output = [l.replace('\r', '').split(',') for l in output if l != '']
-
-    # note:
-    # shaderinfo -t parameters are offset by 3
-    # shaderinfo -d parameters offset by 1
-    param_data = []
-    output_d = output_d[1:]
-    for i,l in enumerate(output[3:]):
-        param_data.append( {'name': l[0],
-                            'data_type': l[3],
-                            'default': l[6],
-                            'array': ('shader[' in output_d[i])
-                            } )
-    shader_name = output[0]
-    shader_type = output[1]
-
-    return shader_type, param_data
+    return info['type'], info['params']
 
 
 # Return list-formatted shader annotations etc from 3Delight shaderinfo
@@ -301,14 +280,11 @@ def get_3dl_annotations(shader_path_list, shader_name):
     if filename == None:
         return None
 
-    try:
-        output = subprocess.check_output(["shaderinfo", "-a", filename], stderr=subprocess.STDOUT).decode().split('\n')
-    except subprocess.CalledProcessError:
+    info = get_shader_info(filename)
+    if info is None:
         return None
-
-    output = [o.replace('\r', '') for o in output]
     
-    return output
+    return info['annotations']
 
 
 def update_shader_parameter(self, context):
@@ -778,6 +754,58 @@ def shaderparameters_from_class(param_object):
 
     return parameters
 
+# Registry of the property groups generated for shader parameters, so they are
+# only generated and registered again when a shader's file changes on disk.
+# rna_types_initialise runs on every export, for every material, lamp and world.
+class ShaderRnaRegistry:
+
+    def __init__(self):
+        # (shader type, shader name) -> {'mtime', 'class'}
+        self.classes = {}
+        # shaders collection type -> class its parameters pointerproperty uses
+        self.assigned = {}
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.registered = 0
+        self.reused = 0
+        self.unchanged = 0
+
+    def lookup(self, shader_type, name, mtime):
+        entry = self.classes.get((shader_type, name))
+        if entry is None or mtime is None or entry['mtime'] != mtime:
+            return None
+        self.reused += 1
+        return entry['class']
+
+    def add(self, shader_type, name, mtime, new_class):
+        self.classes[(shader_type, name)] = {'mtime': mtime, 'class': new_class}
+        self.registered += 1
+
+    # forget the class a shaders collection uses, after its properties have been deleted
+    def remove(self, stored_shaders):
+        old_class = self.assigned.pop(type(stored_shaders), None)
+        if old_class is None:
+            return
+        for key in [k for k, v in self.classes.items() if v['class'] is old_class]:
+            del self.classes[key]
+
+    def summary(self):
+        return "Shader parameters: %d classes registered, %d reused, %d unchanged" % \
+                (self.registered, self.reused, self.unchanged)
+
+
+shader_rna_registry = ShaderRnaRegistry()
+
+def shader_file_mtime(shader_path_list, shader_name):
+    filename = shader_filename(shader_path_list, shader_name)
+    if filename is None:
+        return None
+    try:
+        return os.path.getmtime(filename)
+    except OSError:
+        return None
+
 def rna_type_initialise(scene, rmptr, shader_type, replace_existing):
 
     init_env(scene)
@@ -828,18 +856,40 @@ def rna_type_initialise(scene, rmptr, shader_type, replace_existing):
                 pass
     
     shader_paths = get_path_list(scene.renderman, 'shader')
-    name, parameters = get_parameters_shaderinfo(shader_paths, stored_shaders.active, shader_type)
+    
+    # shaders chosen or refreshed from the interface always get new parameters
+    if replace_existing:
+        shader_rna_registry.remove(stored_shaders)
+    
+    mtime = shader_file_mtime(shader_paths, stored_shaders.active)
+    new_class = shader_rna_registry.lookup(shader_type, stored_shaders.active, mtime)
+    
+    if new_class is None:
+        name, parameters = get_parameters_shaderinfo(shader_paths, stored_shaders.active, shader_type)
 
-    if name == '':
-        print('no name')
+        if name == '':
+            print('no name')
+            return
+
+        new_class = shader_settings_class(scene, rmptr, name, parameters)
+        shader_rna_registry.add(shader_type, stored_shaders.active, mtime, new_class)
+
+    # skip updating the pointerproperty if it's already using this shader's class
+    if shader_rna_registry.assigned.get(type(stored_shaders)) is new_class:
+        shader_rna_registry.unchanged += 1
         return
+    
+    # Add parameters to Shader pointerproperty
+    setattr(type(stored_shaders), "parameters", bpy.props.PointerProperty(type=new_class, name=new_class.shader_name) )
+    shader_rna_registry.assigned[type(stored_shaders)] = new_class
 
-    # Generate an RNA Property group for this shader, limiting name length for rna specs
+
+# Generate and register an RNA Property group for a shader's parameters
+def shader_settings_class(scene, rmptr, name, parameters):
+    # limiting name length for rna specs
     new_class = type('%sShdSettings' % name[:21], (bpy.types.PropertyGroup,), {})
     bpy.utils.register_class(new_class)
-
-    # Add parameters to Shader pointerproperty
-    setattr(type(stored_shaders), "parameters", bpy.props.PointerProperty(type=new_class, name=name) )
+    new_class.shader_name = name
 
     new_class.meta = {}
 	# BBM addition begin
@@ -932,7 +982,7 @@ def rna_type_initialise(scene, rmptr, shader_type, replace_existing):
 
 		#BBM addition end
 
-        
+    return new_class
 
 
 def shader_type_initialised(ptr, shader_type):
@@ -952,6 +1002,7 @@ def shader_type_initialised(ptr, shader_type):
     return False
 
 
+@profiled()
 def rna_types_initialise(scene):
     
     idblocks = list(bpy.data.materials) + list(bpy.data.lamps) + list(bpy.data.worlds)
@@ -986,4 +1037,6 @@ def rna_types_initialise(scene):
             #if not shader_type_initialised(rmptr, shader_type):
             rna_type_initialise(scene, rmptr, shader_type, False)
     
+    save_shader_info_cache()
+    
     
\ No newline at end of file
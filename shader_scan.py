@@ -24,13 +24,17 @@
 # ##### END MIT LICENSE BLOCK #####
 
 import threading
+import multiprocessing
 import os
-import subprocess
 import time
 
 import bpy
 from .util import init_env
 from .util import get_path_list_converted
+from .shader_info import get_shader_infos
+from .shader_info import save_shader_info_cache
+from .shader_info import shader_info_settings
+from .file_watch import create_watcher
 
 
 def shader_visbility_annotation(annotations):
@@ -41,94 +45,184 @@ def shader_visbility_annotation(annotations):
                 return False
     return True
 
-# Setup for scanning for available shaders to display in the UI
-# This is done in a background thread to avoid blocking the UI while scanning files
-shader_cache = {}
+# Index of the shaders available in the shader paths, to display in the UI.
+# Entries are kept per file, and only files that changed since they were last
+# scanned are read again, in a background thread to avoid blocking the UI.
+# Changes are picked up from inotify where available, or by polling file
+# modification times and sizes otherwise. Paths that can't be watched, 
+# such as ones that don't exist yet, are polled until they can be.
+
+# seconds between polls of the shader paths, when they can't be watched
+shader_poll_interval = 2.0
+
+common_shader_types = ('surface', 'displacement', 'interior', 'atmosphere', 'shader', 'light')
+
+class ShaderIndex:
+
+    def __init__(self):
+        self.path_list = None
+        self.watcher = None
+        self.last_poll = 0.0
+        self.scanned = False
+
+        # filename -> (mtime, size) when it was last scanned
+        self.files = {}
+        # filename -> (name, type) of the visible shaders
+        self.shaders = {}
+        # filenames waiting to be scanned
+        self.pending = set()
+
+    def set_paths(self, path_list):
+        if path_list == self.path_list:
+            return
+
+        self.path_list = list(path_list)
+        self.files = {}
+        self.shaders = {}
+        self.pending = set()
+
+        if self.watcher is not None:
+            self.watcher.close()
+        self.watcher = create_watcher()
+        self.poll(force=True)
+
+        # nothing to scan, so the empty index is complete
+        self.scanned = len(self.pending) == 0
+
+    def sdl_files(self):
+        for path in self.path_list:
+            try:
+                names = os.listdir(path)
+            except OSError:
+                continue
+            for f in names:
+                if os.path.splitext(f)[1] == '.sdl':
+                    yield os.path.join(path, f)
+
+    def close(self):
+        if self.watcher is not None:
+            self.watcher.close()
+            self.watcher = None
+        self.path_list = None
+
+    # paths that aren't being watched for changes
+    def unwatched_paths(self):
+        if self.watcher is None:
+            return self.path_list
+        return [p for p in self.path_list if p not in self.watcher.paths]
+
+    # compare the shader paths on disk with the index, and queue any changed files
+    def poll(self, force=False):
+        now = time.time()
+        if not force and now - self.last_poll < shader_poll_interval:
+            return
+        self.last_poll = now
+
+        # watch paths that have appeared, or come back, before reading them
+        # so no changes are missed in between
+        if self.watcher is not None:
+            for path in self.unwatched_paths():
+                if os.path.isdir(path):
+                    self.watcher.add(path)
+
+        found = set()
+        for filename in self.sdl_files():
+            try:
+                st = os.stat(filename)
+            except OSError:
+                continue
+            found.add(filename)
+            if self.files.get(filename) != (st.st_mtime, st.st_size):
+                self.pending.add(filename)
+
+        # removed files
+        self.pending.update(f for f in self.files if f not in found)
+
+    def check_changes(self):
+        if self.watcher is None:
+            self.poll()
+            return
+
+        changed = self.watcher.changes()
+        if changed is None:
+            self.poll(force=True)
+            return
+        
+        self.pending.update(f for f in changed if os.path.splitext(f)[1] == '.sdl')
+        if len(self.unwatched_paths()) > 0:
+            self.poll()
+
+    # scan the queued files, and update their entries
+    def update(self, settings, workers):
+        filenames = sorted(self.pending)
+        self.pending = set()
+
+        infos = get_shader_infos(filenames, settings, workers)
+
+        # build the new entries separately, the UI may be reading the old ones meanwhile
+        shaders = dict(self.shaders)
+        for filename, info in zip(filenames, infos):
+            shaders.pop(filename, None)
+            try:
+                st = os.stat(filename)
+                self.files[filename] = (st.st_mtime, st.st_size)
+            except OSError:
+                self.files.pop(filename, None)
+                continue
+
+            # Use the #pragma annotation "visibility" shader annotation to hide from view
+            if info is None or shader_visbility_annotation(info['annotations']) == False:
+                continue
+
+            shaders[filename] = (info['name'], info['type'])
+
+        self.shaders = shaders
+        self.scanned = True
+
+    def shader_list(self, shader_type=''):
+        shaders = {t:[] for t in common_shader_types}
+        for sdlname, sdltype in sorted(self.shaders.values()):
+            shaders.setdefault(sdltype, []).append(sdlname)
+
+        if shader_type != '' and shader_type in shaders.keys():
+            return sorted(shaders[shader_type], key=str.lower)
+        else:
+            return [item for sublist in shaders.values() for item in sublist]
+
+
+shader_index = ShaderIndex()
 shaderscan_lock = threading.Lock()
 
+# number of shaderinfo processes to run at once, from the addon preferences
+def shader_scan_workers():
+    try:
+        workers = bpy.context.user_preferences.addons[__package__].preferences.shader_scan_workers
+    except (AttributeError, KeyError):
+        workers = 0
+    
+    if workers == 0:
+        workers = multiprocessing.cpu_count()
+    return workers
+
+# scans the changed files in the shader index, started with the lock already held.
+# settings are read from blender beforehand, on the main thread
 class BgShaderScan(threading.Thread):
-    def __init__(self, lock, path_list, material):
+    def __init__(self, lock, index, material, settings, workers=1):
         threading.Thread.__init__(self)
         self.lock = lock
-        self.path_list = path_list
+        self.index = index
         self.material = material
+        self.settings = settings
+        self.workers = workers
         self.daemon = True   
     
     def run(self):
-        global shader_cache
-        regenerate = False
-        
-        # limit to only one BG thread at a time, exit rather than wait
-        if not self.lock.acquire(blocking=False):
-            return
-
-        # global shader cache for all scenes
-        shader_cache = {}
-        shader_cache['dirs'] = {}
-        shader_cache['shaders'] = {}
-        
-        # initialise some common ones
-        shader_cache['shaders']['surface'] = []
-        shader_cache['shaders']['displacement'] = []
-        shader_cache['shaders']['interior'] = []
-        shader_cache['shaders']['atmosphere'] = []
-        shader_cache['shaders']['shader'] = []
-        shader_cache['shaders']['light'] = []
-                    
-        # check to see if any dirs have been modified since the last scan, 
-        # and if so prepare to regenerate
-        for path in self.path_list:
-            #print(path)
-            if not path in shader_cache['dirs'].keys():
-                shader_cache['dirs'][path] = 0.0
-
-            if shader_cache['dirs'][path] < os.path.getmtime(path):
-                regenerate = True
-                break
-
-        # return if we don't need to scan shaders
-        if not regenerate:
-            # block for a couple more seconds, to prevent too much scanning
-            time.sleep(2)
+        try:
+            self.index.update(self.settings, self.workers)
+        finally:
             self.lock.release()
-            return
-        
-        shaders = {}
-        # we need to regenerate, so rebuild entire shader list from all paths
-        for k in shader_cache['shaders'].keys():
-            shader_cache['shaders'][k] = ['Loading...']
-            shaders[k] = []
-        
-        for path in self.path_list:
-            # store the time of this scan
-            shader_cache['dirs'][path] = os.path.getmtime(path)
-
-            # now store the updated shader contents
-            for f in os.listdir(path):           
-                if os.path.splitext(f)[1] == '.sdl':
-                    try:
-                        output = subprocess.check_output(["shaderinfo", "-t", os.path.join(path, f)]).decode().split('\n')
-                        ann_output = subprocess.check_output(["shaderinfo", "-a", os.path.join(path, f)]).decode().split('\n')
-                    except:
-                        continue
-
-                    # Use the #pragma annotation "visibility" shader annotation to hide from view
-                    ann_output = [o.replace('\r', '') for o in ann_output]
-                    if shader_visbility_annotation(ann_output) == False:
-                        continue
-                    
-                    sdlname = output[0].replace('\r', '')
-                    sdltype = output[1].replace('\r', '')
-
-                    if not sdltype in shaders.keys():
-                        shaders[sdltype] = []
-
-                    shaders[sdltype].append(sdlname)
         
-        # set the new shader cache
-        shader_cache['shaders'] = shaders
-        
-        self.lock.release()
+        save_shader_info_cache(self.settings)
         
         # XXX -- SUPER dodgy hack to force redraw of the property editor 
         # when the thread is done, since we have no other way atm
@@ -139,37 +233,36 @@ class BgShaderScan(threading.Thread):
             except:
                 pass
 
-# scans valid paths on disk for shaders, and caches for later retrieval
+# returns shaders found in valid paths on disk, scanning changed files for later retrieval
 def shaders_in_path(prefs, idblock, shader_type='', threaded=True):
-    global shaderscan_lock
-    global shader_cache
-
     init_env(prefs)
     
     if type(idblock) == bpy.types.Material:
         material = idblock
-    #if hasattr(context, "material"):
-    #    material = context.material
     else:
         material = None
     
     path_list = get_path_list_converted(prefs, 'shader')
     
-    scanthread = BgShaderScan(shaderscan_lock, path_list, material)
-    if threaded:
-        scanthread.start()
-    else:
-        print('run')
-        scanthread.run()
-
+    # limit to only one BG scan at a time, if threaded return what's indexed so far
+    if shaderscan_lock.acquire(blocking=not threaded):
+        shader_index.set_paths(path_list)
+        shader_index.check_changes()
 
-    if shader_cache != {}:
-        if shader_type != '' and shader_type in shader_cache['shaders'].keys():
-            return sorted(shader_cache['shaders'][shader_type], key=str.lower)
+        if len(shader_index.pending) > 0:
+            scanthread = BgShaderScan(shaderscan_lock, shader_index, material, 
+                                      shader_info_settings(), shader_scan_workers())
+            if threaded:
+                scanthread.start()
+            else:
+                scanthread.run()
         else:
-            shaderlist = [l for l in shader_cache['shaders'].values()]
-            print('SHADER LIST ----------')
-            print(shaderlist)
-            return [item for sublist in shaderlist for item in sublist] 
-    else:
+            shaderscan_lock.release()
+
+    if not shader_index.scanned:
         return ['Loading...']
+    return shader_index.shader_list(shader_type)
+
+# the watcher is only used on the main thread, the background scan never touches it
+def unregister():
+    shader_index.close()
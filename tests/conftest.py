@@ -0,0 +1,47 @@
+# ##### BEGIN MIT LICENSE BLOCK #####
+#
+# Copyright (c) 2011 Matt Ebb
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
+#
+# ##### END MIT LICENSE BLOCK #####
+
+import os
+import pytest
+
+# The addon's folder is a package only inside blender, its __init__ needs bpy and blf.
+# pytest would import it to set up the tests inside it, so it's collected as a plain
+# directory instead. The tests load the addon modules through the benchmarks' fake bpy.
+#
+# Hooks in this file only apply to the tests folder, the addon folder above it is
+# collected through a plugin registered for the whole session.
+
+addon_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+class AddonFolder:
+    
+    def pytest_collect_directory(self, path, parent):
+        if str(path) == addon_dir:
+            return pytest.Dir.from_parent(parent, path=path)
+
+def pytest_configure(config):
+    # directory collectors can only be replaced from pytest 8
+    if hasattr(pytest, 'Dir'):
+        config.pluginmanager.register(AddonFolder(), 'renderman_addon_folder')
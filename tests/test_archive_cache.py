@@ -0,0 +1,106 @@
+# ##### BEGIN MIT LICENSE BLOCK #####
+#
+# Copyright (c) 2011 Matt Ebb
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
+#
+# ##### END MIT LICENSE BLOCK #####
+
+import os
+import sys
+import shutil
+import tempfile
+import importlib
+import unittest
+
+# Run from the addon's folder with:
+#   python -m unittest discover -s tests, or pytest
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks import fake_bpy
+
+fake_bpy.load_addon()
+archive_cache = importlib.import_module(fake_bpy.addon_name + '.archive_cache')
+
+
+class TestArchiveCache(unittest.TestCase):
+    
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.cache = archive_cache.ArchiveCache(os.path.join(self.dir, 'cache'))
+    
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+    
+    # writes an archive of size bytes, last used at mtime
+    def write(self, key, size, mtime):
+        path = self.cache.new_path(key)
+        with open(path, 'wb') as f:
+            f.write(b'#' * size)
+        os.utime(path, (mtime, mtime))
+        return path
+    
+    def test_lookup(self):
+        self.assertIsNone(self.cache.lookup('a'))
+        path = self.write('a', 10, 1000)
+        self.assertEqual(self.cache.lookup('a'), path)
+        self.assertGreater(os.path.getmtime(path), 1000)
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 1))
+    
+    def test_evict_least_recently_used(self):
+        old = self.write('old', 100, 1000)
+        new = self.write('new', 100, 2000)
+        self.cache.begin()
+        
+        self.cache.max_size = 150
+        self.cache.evict()
+        self.assertFalse(os.path.exists(old))
+        self.assertTrue(os.path.exists(new))
+        self.assertEqual(self.cache.evicted, 1)
+    
+    def test_never_evict_in_use(self):
+        # written or looked up by this export, so referenced by its RIB
+        written = self.write('written', 100, 1000)
+        self.write('hit', 100, 1000)
+        hit = self.cache.lookup('hit')
+        
+        self.cache.max_size = 1
+        self.cache.evict()
+        self.assertTrue(os.path.exists(written))
+        self.assertTrue(os.path.exists(hit))
+        
+        # a new export no longer needs them
+        self.cache.begin()
+        self.cache.evict()
+        self.assertFalse(os.path.exists(written))
+        self.assertFalse(os.path.exists(hit))
+    
+    def test_use(self):
+        path = self.write('a', 10, 1000)
+        self.cache.begin()
+        self.assertTrue(self.cache.use(path))
+        self.assertIn(path, self.cache.in_use)
+        
+        os.remove(path)
+        self.assertFalse(self.cache.use(path))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,194 @@
+# ##### BEGIN MIT LICENSE BLOCK #####
+#
+# Copyright (c) 2011 Matt Ebb
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
+#
+# ##### END MIT LICENSE BLOCK #####
+
+import io
+import os
+import sys
+import struct
+import unittest
+from array import array
+
+# Run from the addon's folder with:
+#   python -m unittest discover -s tests, or pytest
+# The addon is loaded with the benchmarks' fake bpy, without its __init__,
+# which needs blender.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks import fake_bpy
+
+binary_rib = fake_bpy.load_addon().binary_rib
+
+# Decodes the binary RIB written by binary_rib, into a list of values:
+# ints, floats, strings, lists for arrays and ('request', name) for requests
+def decode(data):
+    values = []
+    stack = [values]
+    requests = {}
+    pos = 0
+    
+    def take(n):
+        nonlocal pos
+        pos += n
+        return data[pos-n:pos]
+    
+    def string(c):
+        if binary_rib.RIB_STRING_SHORT <= c < binary_rib.RIB_STRING_SHORT + 16:
+            n = c - binary_rib.RIB_STRING_SHORT
+        else:
+            n = int.from_bytes(take(c - binary_rib.RIB_STRING + 1), 'big')
+        return take(n).decode('utf-8')
+    
+    while pos < len(data):
+        c = take(1)[0]
+        
+        if c == ord('['):
+            stack.append([])
+        elif c == ord(']'):
+            array_values = stack.pop()
+            stack[-1].append(array_values)
+        elif binary_rib.RIB_INT <= c < binary_rib.RIB_INT + 4:
+            stack[-1].append(int.from_bytes(take(c - binary_rib.RIB_INT + 1), 'big', signed=True))
+        elif binary_rib.RIB_STRING_SHORT <= c < binary_rib.RIB_STRING + 4:
+            stack[-1].append(string(c))
+        elif c == binary_rib.RIB_FLOAT:
+            stack[-1].append(struct.unpack('>f', take(4))[0])
+        elif binary_rib.RIB_FLOAT_ARRAY <= c < binary_rib.RIB_FLOAT_ARRAY + 4:
+            n = int.from_bytes(take(c - binary_rib.RIB_FLOAT_ARRAY + 1), 'big')
+            stack[-1].append(list(struct.unpack('>%df' % n, take(n * 4))))
+        elif c == binary_rib.RIB_DEFINE_REQUEST:
+            code = take(1)[0]
+            requests[code] = string(take(1)[0])
+        elif c == binary_rib.RIB_REQUEST:
+            stack[-1].append( ('request', requests[take(1)[0]]) )
+        else:
+            raise ValueError("Unexpected byte %o at %d" % (c, pos-1))
+    
+    return values
+
+# float32 rounding of a value
+def f32(v):
+    return array('f', [v])[0]
+
+class RibBuffer(io.BytesIO):
+    ''' In memory file for BinaryRibWriter, keeping its contents once closed '''
+    name = 'test.rib'
+    
+    def close(self):
+        self.value = self.getvalue()
+        io.BytesIO.close(self)
+
+def write_binary(*writes):
+    file = RibBuffer()
+    writer = binary_rib.BinaryRibWriter(file)
+    for data in writes:
+        if type(data) == str:
+            writer.write(data)
+        else:
+            writer.write_array(data)
+    writer.close()
+    return file.value
+
+
+class TestEncoding(unittest.TestCase):
+
+    def test_int(self):
+        for i, size in ((0, 2), (-1, 2), (127, 2), (-128, 2), (128, 3), (-129, 3),
+                        (40000, 4), (-8388608, 4), (2**31-1, 5), (-2**31, 5)):
+            data = binary_rib.encode_int(i)
+            self.assertEqual(len(data), size)
+            self.assertEqual(decode(data), [i])
+    
+    def test_int_out_of_range_is_float(self):
+        self.assertEqual(decode(binary_rib.encode_int(2**31)), [f32(2**31)])
+    
+    def test_float(self):
+        for f in (0.0, 0.5, -3.25, 1e-3, 123456.789):
+            self.assertEqual(decode(binary_rib.encode_float(f)), [f32(f)])
+    
+    def test_string(self):
+        for s in ('', 'P', 'x' * 15, 'x' * 16, 'y' * 300, 'café'):
+            self.assertEqual(decode(binary_rib.encode_string(s)), [s])
+        
+        self.assertEqual(binary_rib.encode_string('P')[0], binary_rib.RIB_STRING_SHORT + 1)
+        self.assertEqual(binary_rib.encode_string('y' * 300)[0], binary_rib.RIB_STRING + 1)
+    
+    def test_unescape_string(self):
+        self.assertEqual(binary_rib.unescape_string(r'"a\"b\\c\nd"'), 'a"b\\c\nd')
+    
+    def test_float_array(self):
+        v = [0.0, 0.1, -2.5, 1e6]
+        data = binary_rib.encode_float_array_header(len(v)) + binary_rib.float_array_bytes(v)
+        self.assertEqual(decode(data), [[f32(f) for f in v]])
+    
+    def test_int_array(self):
+        v = [0, 1, -1, 300, 2**31-1, -2**31]
+        self.assertEqual(decode(b'[' + binary_rib.int_array_bytes(v) + b']'), [v])
+
+
+class TestBinaryRibWriter(unittest.TestCase):
+
+    def test_requests_and_parameters(self):
+        rib = 'Attribute "identifier" "name" [ "Grid" ]\n' \
+              'PointsPolygons [ 4 4 ] [ 0 1 2 3 1 2 4 5 ] "P" [ 0 0.5 -1 2.25 ]\n' \
+              'Attribute "visibility" "integer camera" [ 1 ]\n'
+        
+        self.assertEqual(decode(write_binary(rib)), [
+            ('request', 'Attribute'), 'identifier', 'name', ['Grid'],
+            ('request', 'PointsPolygons'), [4, 4], [0, 1, 2, 3, 1, 2, 4, 5], 'P', [0.0, 0.5, -1.0, 2.25],
+            ('request', 'Attribute'), 'visibility', 'integer camera', [1]])
+    
+    def test_requests_defined_once(self):
+        data = write_binary('WorldBegin\nAttributeBegin\nAttributeEnd\nAttributeBegin\nAttributeEnd\nWorldEnd\n')
+        
+        self.assertEqual(data.count(bytes([binary_rib.RIB_DEFINE_REQUEST])), 4)
+        self.assertEqual([v[1] for v in decode(data)], 
+            ['WorldBegin', 'AttributeBegin', 'AttributeEnd', 'AttributeBegin', 'AttributeEnd', 'WorldEnd'])
+    
+    def test_comments_and_escapes(self):
+        rib = '# header comment\nDisplay "a \\"quoted\\" name.tif" "tiff" "rgba" # trailing\n'
+        
+        self.assertEqual(decode(write_binary(rib)), 
+            [('request', 'Display'), 'a "quoted" name.tif', 'tiff', 'rgba'])
+    
+    def test_write_array(self):
+        P = array('f', [0.25 * i for i in range(10000)])
+        verts = array('i', range(-5000, 5000))
+        
+        data = write_binary('PointsPolygons ', array('i', [4]), ' ', verts, ' "P" ', P, '\n')
+        
+        self.assertEqual(decode(data), [('request', 'PointsPolygons'), [4], list(verts), 'P', list(P)])
+    
+    def test_split_writes(self):
+        rib = 'Attribute "identifier" "name" [ "Grid" ]\n# comment\nSphere 1 -1 1 360\n' \
+              'Points "P" [ 0.5 1 1.5 ] "constantwidth" [ 0.05 ]\n'
+        expected = write_binary(rib)
+        
+        for split in range(1, len(rib)):
+            self.assertEqual(write_binary(rib[:split], rib[split:]), expected)
+        self.assertEqual(write_binary(*rib), expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
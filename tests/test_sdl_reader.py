@@ -0,0 +1,212 @@
+# ##### BEGIN MIT LICENSE BLOCK #####
+#
+# Copyright (c) 2011 Matt Ebb
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
+#
+# ##### END MIT LICENSE BLOCK #####
+
+import os
+import sys
+import glob
+import tempfile
+import importlib
+import unittest
+
+# Run from the addon's folder with:
+#   python -m unittest discover -s tests, or pytest
+# The addon is loaded with the benchmarks' fake bpy, without its __init__,
+# which needs blender.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks import fake_bpy
+
+fake_bpy.load_addon()
+sdl_reader = importlib.import_module(fake_bpy.addon_name + '.sdl_reader')
+
+shaders_dir = os.path.join(fake_bpy.addon_dir, 'shaders')
+
+def shader_path(name):
+    return os.path.join(shaders_dir, name + '.sdl')
+
+def param(name, data_type, default, array=False):
+    return {'name': name, 'data_type': data_type, 'default': default, 'array': array}
+
+# read_sdl output for the bundled shaders, checked against their .sl sources
+fixtures = {
+    'plastic': {'type': 'surface',
+        'params': [param('Ks', 'float', '0.5'),
+                   param('Kd', 'float', '0.5'),
+                   param('Ka', 'float', '1'),
+                   param('roughness', 'float', '0.1'),
+                   param('specularcolor', 'color', '1 1 1')],
+        'annotations': ['']},
+    'texture_cosh': {'type': 'shader',
+        'params': [param('inputfile', 'string', ''),
+                   param('colorcorrect', 'shader', ''),
+                   param('__category', 'string', '')],
+        'annotations': ['"__category" "gadgettype=stringfield"',
+                        '"colorcorrect" "gadgettype=textfield"',
+                        '"inputfile" "gadgettype=inputfile"',
+                        '']},
+    'spotLight': {'type': 'light',
+        'params': [param('light_color', 'color', '1 1 1'),
+                   param('light_intensity', 'float', '1'),
+                   param('is_directional', 'float', '0'),
+                   param('cone_angle', 'float', '20'),
+                   param('penumbra_angle', 'float', '15'),
+                   param('falloff_power', 'float', '0'),
+                   param('diff_contribution', 'float', '1'),
+                   param('spec_contribution', 'float', '1'),
+                   param('shadow_coshaders', 'shader', '', array=True)]},
+    'gadgetTypes_surface': {'type': 'surface',
+        'params': [param('floatfield', 'float', '0.52'),
+                   param('floatslider', 'float', '0.25'),
+                   param('intfield', 'float', '53'),
+                   param('intslider', 'float', '35'),
+                   param('textfield', 'string', 'defaultTestField'),
+                   param('inputfile', 'string', 'defaultInputFile'),
+                   param('optionmenu', 'float', '2'),
+                   param('checkbox', 'float', '1'),
+                   param('colorslider', 'color', '1 0.6 0.3'),
+                   param('single_coshader', 'shader', ''),
+                   param('coshader_list', 'shader', '', array=True)]},
+    }
+
+# shaders with defaults that aren't constants, left to shaderinfo
+unreadable = ['brdf_env', 'uberlight']
+
+# Walks the %code section the same way as parse_sdl, returning the constants,
+# the parameters and the code initialising each of them
+def init_code(name):
+    with open(shader_path(name), 'rb') as f:
+        lines = f.read().decode('latin-1').split('\n')
+    cursor = sdl_reader.SdlLines(lines, lines.index([l for l in lines if l.startswith('%code')][0]) + 1)
+    cursor.next_int()
+    cursor.blank()
+    cursor.pos += sdl_reader.num_globals
+    
+    constants = [sdl_reader.parse_constant(cursor.next()) for i in range(cursor.next_int())]
+    params = [sdl_reader.parse_parameter(cursor.next()) for i in range(cursor.next_int())]
+    while lines[cursor.pos].strip() != '' or lines[cursor.pos+1].strip() != '':
+        cursor.pos += 1
+    cursor.pos += 2
+    
+    return constants, params, [cursor.code_block() for p in params]
+
+
+class TestReadSdl(unittest.TestCase):
+    
+    def test_bundled_shaders(self):
+        for name, expected in fixtures.items():
+            with self.subTest(shader=name):
+                info = sdl_reader.read_sdl(shader_path(name))
+                self.assertIsNotNone(info)
+                self.assertEqual(info['name'], name)
+                self.assertEqual(info['type'], expected['type'])
+                self.assertEqual(info['params'], expected['params'])
+                if 'annotations' in expected:
+                    self.assertEqual(info['annotations'], expected['annotations'])
+    
+    def test_annotations(self):
+        info = sdl_reader.read_sdl(shader_path('light_distant'))
+        self.assertIn('"shadowmap" "meta=shadow_map_path;label=Shadow Map Path;hide=True;"', info['annotations'])
+        self.assertEqual(info['annotations'][-1], '')
+    
+    def test_unreadable_shaders(self):
+        for name in unreadable:
+            with self.subTest(shader=name):
+                self.assertIsNone(sdl_reader.read_sdl(shader_path(name)))
+    
+    def test_not_sdl(self):
+        self.assertIsNone(sdl_reader.read_sdl(os.path.join(shaders_dir, 'plastic.sl')))
+        self.assertIsNone(sdl_reader.read_sdl(os.path.join(shaders_dir, 'missing.sdl')))
+        
+        with tempfile.NamedTemporaryFile(suffix='.sdl', delete=False) as f:
+            f.write(sdl_reader.sdl_magic + b'\n%code 7 1\n')
+        try:
+            self.assertIsNone(sdl_reader.read_sdl(f.name))
+        finally:
+            os.remove(f.name)
+    
+    def test_all_bundled_shaders(self):
+        # whatever can't be read must fall back to shaderinfo, never raise
+        for filename in glob.glob(os.path.join(shaders_dir, '*.sdl')):
+            info = sdl_reader.read_sdl(filename)
+            if info is not None:
+                self.assertIn(info['type'], sdl_reader.shader_types.values())
+
+
+class TestSymbolTable(unittest.TestCase):
+    
+    def test_num_globals(self):
+        self.assertEqual(sdl_reader.num_globals, 28)
+        
+        # past the globals' usage flags come the constants, then the parameters
+        for name, expected in fixtures.items():
+            with self.subTest(shader=name):
+                constants, params, code = init_code(name)
+                self.assertGreater(len(constants), 0)
+                self.assertEqual([p['name'] for p in params], [p['name'] for p in expected['params']])
+    
+    def test_opcodes(self):
+        constants, params, code = init_code('gadgetTypes_surface')
+        ops = [[i[0] for i in block] for block in code]
+        self.assertEqual(ops[0], [sdl_reader.OP_MOVE_FLOAT])
+        self.assertEqual(ops[4], [sdl_reader.OP_MOVE_STRING])
+        self.assertEqual(ops[8], [sdl_reader.OP_BUILD_TRIPLE])
+        
+        constants, params, code = init_code('plastic')
+        ops = [[i[0] for i in block] for block in code]
+        self.assertEqual(ops[:4], [[sdl_reader.OP_MOVE_FLOAT]] * 4)
+        self.assertEqual(ops[4], [sdl_reader.OP_PROMOTE_TRIPLE])
+    
+    def test_parameter_default(self):
+        g = sdl_reader.num_globals
+        constants = [(1, '0.5'), (1, '1'), (1, '0.25'), (4, 'name'), (3, '1 0 0')]
+        symbol = g + len(constants)
+        
+        def default(data_type, *code):
+            return sdl_reader.parameter_default({'data_type': data_type}, [list(code)], symbol, constants)
+        
+        self.assertEqual(default(1, sdl_reader.OP_MOVE_FLOAT, symbol, g), '0.5')
+        self.assertEqual(default(4, sdl_reader.OP_MOVE_STRING, symbol, g+3), 'name')
+        self.assertEqual(default(3, sdl_reader.OP_PROMOTE_TRIPLE, symbol, g+1), '1 1 1')
+        self.assertEqual(default(3, sdl_reader.OP_BUILD_TRIPLE, symbol, g, g+1, g+2), '0.5 1 0.25')
+        self.assertEqual(default(13, sdl_reader.OP_MOVE_SHADER, symbol, g), '')
+        
+        # anything but a constant default isn't understood
+        self.assertIsNone(default(1, sdl_reader.OP_MOVE_FLOAT, symbol + 1, g))
+        self.assertIsNone(default(1, sdl_reader.OP_MOVE_FLOAT, symbol, g + 10))
+        self.assertIsNone(default(3, sdl_reader.OP_PROMOTE_TRIPLE, symbol, g+3))
+        self.assertIsNone(default(1, 99, symbol, g))
+        self.assertIsNone(sdl_reader.parameter_default({'data_type': 1}, [], symbol, constants))
+    
+    def test_parse_constant(self):
+        self.assertEqual(sdl_reader.parse_constant('0 1 1.00000001e-01'), (1, '0.1'))
+        self.assertEqual(sdl_reader.parse_constant('0 3 1.0 6.0e-01 0.3'), (3, '1 0.6 0.3'))
+        self.assertEqual(sdl_reader.parse_constant(r'0 4 "a \"b\"\n"'), (4, 'a "b"\n'))
+        self.assertEqual(sdl_reader.parse_constant('0 12 0'), (12, None))
+        with self.assertRaises(sdl_reader.SdlFormatError):
+            sdl_reader.parse_constant('0 1')
+
+
+if __name__ == '__main__':
+    unittest.main()
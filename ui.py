@@ -402,6 +402,23 @@ class RENDER_PT_renderman_output(bpy.types.Panel):
         rm = scene.renderman
         
         layout.prop(rm, "path_rib_output")
+        layout.prop(rm, "rib_format")
+        row = layout.row()
+        row.prop(rm, "rib_compression")
+        sub = row.row()
+        sub.active = rm.rib_compression
+        sub.prop(rm, "rib_compression_level")
+        layout.prop(rm, "incremental_export")
+        layout.prop(rm, "use_archive_cache")
+        col = layout.column()
+        col.active = rm.use_archive_cache
+        col.prop(rm, "path_archive_cache")
+        col.prop(rm, "archive_cache_size")
+        layout.prop(rm, "use_parallel_export")
+        col = layout.column()
+        col.active = rm.use_parallel_export
+        col.prop(rm, "export_processes")
+        layout.prop(rm, "use_export_profiling")
         layout.prop(rm, "output_action")
         layout.prop(rm, "display_driver")
         if rm.display_driver not in ('idisplay', 'AUTO'):
@@ -1475,6 +1492,7 @@ class PARTICLE_PT_3Delight_particle(ParticleButtonsPanel, bpy.types.Panel):
             col.row().prop(rm, "particle_type", expand=True)
             if rm.particle_type == 'OBJECT':
                 col.prop_search(rm, "particle_instance_object", bpy.data, "objects", text="")
+                col.prop(rm, "particle_instancing")
 
         # XXX: if rm.type in ('sphere', 'disc', 'patch'):
         # implement patchaspectratio and patchrotation   
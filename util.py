@@ -28,6 +28,7 @@ import mathutils
 import re
 import os
 import platform
+from array import array
 
 
 class BlenderVersionError(Exception):
@@ -205,8 +206,8 @@ def rib(v):
     elif type(v) == str:
         return '"%s"' % v
         
-    # list, tuple
-    elif type(v) in (list, tuple):
+    # list, tuple, flat typed array
+    elif type(v) in (list, tuple, array):
         return "[ " + " ".join(str(i) for i in v) + " ]"
     
     # matrix
@@ -219,6 +220,39 @@ def rib(v):
 
     
 
+# Bulk writer for large numeric arrays (P, N, st, etc).
+# Values are formatted a chunk at a time with a fixed precision and written 
+# straight to the file, rather than making a python string for every value.
+# 9 significant digits round trip any single precision float exactly.
+rib_float_precision = 9
+rib_array_chunk_size = 4096
+
+def rib_array_is_int(v):
+    if type(v) == array:
+        return v.typecode not in ('f', 'd')
+    return len(v) > 0 and type(v[0]) in (int, bool)
+
+def write_rib_array(file, prefix, v, suffix=''):
+    # binary RIB writers encode arrays directly
+    if hasattr(file, 'write_array'):
+        file.write(prefix)
+        file.write_array(v)
+        file.write(suffix)
+        return
+    
+    if rib_array_is_int(v):
+        item = '%d '
+    else:
+        item = '%%.%dg ' % rib_float_precision
+    
+    file.write(prefix + '[ ')
+    
+    for i in range(0, len(v), rib_array_chunk_size):
+        chunk = tuple(v[i:i+rib_array_chunk_size])
+        file.write(item * len(chunk) % chunk)
+        
+    file.write(']' + suffix)
+
 def rib_ob_bounds(ob_bb):
     return ( ob_bb[0][0], ob_bb[7][0], bb[0][1], ob_bb[7][1], bb[0][2], ob_bb[7][2] )
 